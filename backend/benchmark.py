@@ -0,0 +1,372 @@
+"""Performance benchmarks for the Radar de Clientes API.
+
+Run from the backend folder:
+
+    python benchmark.py serialization --rows 10000
+    python benchmark.py coldstart --repeat 10
+    python benchmark.py dedup --rows 1000000 --repeat 1
+    python benchmark.py scoring --rows 100000
+    SHARED_STATE_URL=redis://... python benchmark.py throughput --workers 1,2,4 --duration 10 [--revalidate]
+    python benchmark.py search --business-id ID --repeat 20
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Same settings as the API (SHARED_STATE_URL, Supabase); placeholder credentials
+# otherwise, since only "search" and "throughput" talk to the configured Supabase
+load_dotenv(Path(__file__).parent / '.env')
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "benchmark.benchmark.benchmark")
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def fake_lead_rows(count):
+    business_id = str(uuid.uuid4())
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "business_id": business_id,
+            "name": f"Cliente {i}",
+            "email": f"cliente{i}@example.com",
+            "phone": f"(11) 9{i:04d}-{i % 10000:04d}",
+            "interest": "Corte + barba",
+            "source": "landing_page:abcd1234-ef567890" if i % 3 else "manual",
+            "status": "new",
+            "created_at": (now - timedelta(minutes=i)).isoformat(),
+        }
+        for i in range(count)
+    ]
+
+
+def bench_serialization(args):
+    import orjson
+    from pydantic import TypeAdapter
+    from typing import List
+    from server import LeadResponse, parse_datetime
+
+    rows = fake_lead_rows(args.rows)
+    adapter = TypeAdapter(List[LeadResponse])
+
+    def pydantic_path():
+        # Previous flow: parse + model per row, then response_model validation and encoding
+        leads = []
+        for row in rows:
+            lead = dict(row)
+            lead["created_at"] = parse_datetime(lead["created_at"])
+            leads.append(LeadResponse(**lead))
+        content = [lead.model_dump() for lead in leads]
+        validated = adapter.validate_python(content)
+        json.dumps(adapter.dump_python(validated, mode="json")).encode("utf-8")
+
+    def orjson_path():
+        orjson.dumps(rows)
+
+    results = {}
+    for name, fn in (("pydantic", pydantic_path), ("orjson_passthrough", orjson_path)):
+        seconds = timed(fn, args.repeat)
+        results[name] = {
+            "seconds": round(seconds, 6),
+            "ms_per_10k_rows": round(seconds * 1000 * 10000 / args.rows, 3),
+        }
+    results["speedup"] = round(results["pydantic"]["seconds"] / results["orjson_passthrough"]["seconds"], 1)
+    return results
+
+
+COLDSTART_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import server
+imported = time.perf_counter()
+server.create_app()
+created = time.perf_counter()
+heavy = [m for m in ("supabase", "httpx", "google.generativeai") if m in sys.modules]
+print(json.dumps({"import": imported - start, "create_app": created - imported, "heavy_modules": heavy}))
+"""
+
+
+def bench_coldstart(args):
+    # Each sample is a fresh interpreter, as on a new autoscaled worker
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    imports, factories, processes = [], [], []
+    heavy_modules = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", COLDSTART_SCRIPT],
+            cwd=backend_dir, env=os.environ.copy(), capture_output=True, text=True, check=True,
+        ).stdout
+        processes.append(time.perf_counter() - start)
+        sample = json.loads(output.strip().splitlines()[-1])
+        imports.append(sample["import"])
+        factories.append(sample["create_app"])
+        heavy_modules = sample["heavy_modules"]
+    return {
+        "import_ms": round(statistics.median(imports) * 1000, 1),
+        "create_app_ms": round(statistics.median(factories) * 1000, 1),
+        "process_ms": round(statistics.median(processes) * 1000, 1),
+        "heavy_modules_loaded": heavy_modules,
+    }
+
+
+def bench_dedup(args):
+    import random
+    from dedup import find_duplicate_groups
+
+    # Roughly one lead in ten is re-entered with a differently formatted contact
+    rows = fake_lead_rows(args.rows)
+    random.seed(42)
+    for i in random.sample(range(1, args.rows), args.rows // 10):
+        source = rows[i - 1]
+        rows[i]["name"] = source["name"].upper()
+        rows[i]["phone"] = "+55 " + source["phone"].replace("(", "").replace(")", "")
+        rows[i]["email"] = source["email"].replace("@", "+lp@")
+
+    groups = []
+
+    def run():
+        groups[:] = find_duplicate_groups(rows)
+
+    seconds = timed(run, args.repeat)
+    return {
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(args.rows / seconds),
+        "groups": len(groups),
+        "duplicates": sum(len(group) - 1 for group in groups),
+    }
+
+
+def bench_scoring(args):
+    import pandas as pd
+    from scoring import score_frame, score_lead
+
+    rows = fake_lead_rows(args.rows)
+    page_rates = {"abcd1234-ef567890": 0.12}
+    now = datetime.now(timezone.utc)
+
+    def scalar_path():
+        [score_lead(row, page_rates, now) for row in rows]
+
+    def frame_path():
+        score_frame(pd.DataFrame(rows), page_rates, now)
+
+    results = {}
+    for name, fn in (("per_lead", scalar_path), ("vectorized", frame_path)):
+        seconds = timed(fn, args.repeat)
+        results[name] = {"seconds": round(seconds, 4), "rows_per_second": round(args.rows / seconds)}
+    results["speedup"] = round(results["per_lead"]["seconds"] / results["vectorized"]["seconds"], 1)
+    return results
+
+
+# Selective, broad, multi-word, e-mail, phone, typo and no-match queries
+SEARCH_QUERIES = ["bruno", "silva", "bruno silva", "cliente123456", "91234", "(11) 91234-0012", "brunno silvva", "zzqx"]
+
+
+def bench_search(args):
+    from server import supabase
+
+    if not args.business_id:
+        raise SystemExit("search: informe --business-id de um negócio com leads")
+    results = {}
+    for query in SEARCH_QUERIES:
+        params = {"p_business_id": args.business_id, "p_query": query, "p_limit": 21, "p_offset": 0}
+        supabase.rpc("search_leads", params).execute()  # warm-up
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            supabase.rpc("search_leads", params).execute()
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        results[query] = {
+            "p50_ms": round(statistics.median(samples), 1),
+            "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 1),
+        }
+    return results
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(url, timeout=30):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Servidor não respondeu em {timeout}s: {url}")
+
+
+def register_benchmark_user(base_url):
+    """Bearer token of a new user with a business, created through the API"""
+    import httpx
+
+    response = httpx.post(f"{base_url}/api/auth/register", json={
+        "email": f"benchmark-{uuid.uuid4().hex[:12]}@example.com", "password": uuid.uuid4().hex, "name": "Benchmark",
+    }, timeout=30)
+    response.raise_for_status()
+    token = response.json()["access_token"]
+    response = httpx.post(
+        f"{base_url}/api/business", json={"name": "Benchmark", "niche": "barbearia", "city": "São Paulo"},
+        headers={"Authorization": f"Bearer {token}"}, timeout=30,
+    )
+    response.raise_for_status()
+    return token
+
+
+def load_client(url, headers, duration, concurrency, results):
+    """One load generator process: keeps concurrency requests in flight for duration seconds"""
+    import httpx
+
+    async def run():
+        completed = errors = 0
+        deadline = time.monotonic() + duration
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(limits=limits, headers=headers, timeout=10) as client:
+            async def worker():
+                nonlocal completed, errors
+                while time.monotonic() < deadline:
+                    try:
+                        response = await client.get(url)
+                        if response.status_code in (200, 304):
+                            completed += 1
+                        else:
+                            errors += 1
+                    except httpx.HTTPError:
+                        errors += 1
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        results.put((completed, errors))
+
+    asyncio.run(run())
+
+
+def bench_throughput(args):
+    # Each run is a fresh run.py; the clients run in their own processes so the
+    # load generator is not the bottleneck (pin them apart with taskset on big boxes).
+    # The default path is authenticated and ETag-backed, so every request goes
+    # through the shared identity cache and version stamps: it needs the
+    # configured Supabase and SHARED_STATE_URL, as in production
+    if not os.environ.get("SHARED_STATE_URL"):
+        raise SystemExit("throughput: defina SHARED_STATE_URL (redis://...) para medir os workers como em produção")
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    worker_counts = [int(count) for count in args.workers.split(",")]
+    token = args.token
+    runs = {}
+    for workers in worker_counts:
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = subprocess.Popen(
+            [sys.executable, "run.py", "--workers", str(workers), "--port", str(port), "--host", "127.0.0.1"],
+            cwd=backend_dir, env=os.environ.copy(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_until_ready(f"{base_url}/api/health")
+            if token is None:
+                token = register_benchmark_user(base_url)
+            headers = {"Authorization": f"Bearer {token}"}
+            if args.revalidate:
+                # Clients that already hold the current version get 304s
+                import httpx
+                etag = httpx.get(f"{base_url}{args.path}", headers=headers, timeout=30).headers.get("etag")
+                if etag is None:
+                    raise SystemExit(f"throughput: {args.path} não devolveu ETag")
+                headers["If-None-Match"] = etag
+            results = multiprocessing.Queue()
+            clients = [
+                multiprocessing.Process(
+                    target=load_client,
+                    args=(f"{base_url}{args.path}", headers, args.duration, args.concurrency, results),
+                )
+                for _ in range(args.clients)
+            ]
+            for client in clients:
+                client.start()
+            totals = [results.get() for _ in clients]
+            for client in clients:
+                client.join()
+        finally:
+            server.terminate()
+            server.wait()
+        completed = sum(done for done, _ in totals)
+        runs[workers] = {
+            "requests_per_second": round(completed / args.duration),
+            "errors": sum(errors for _, errors in totals),
+        }
+
+    # Efficiency 1.0 means linear scaling from the smallest worker count
+    base_workers = worker_counts[0]
+    base_rps = runs[base_workers]["requests_per_second"] / base_workers
+    for workers, run in runs.items():
+        run["scaling_efficiency"] = round(run["requests_per_second"] / (base_rps * workers), 2) if base_rps else None
+    return {"cpus": os.cpu_count(), "path": args.path, "revalidate": args.revalidate, "runs": runs}
+
+
+BENCHMARKS = {
+    "serialization": bench_serialization,
+    "coldstart": bench_coldstart,
+    "dedup": bench_dedup,
+    "scoring": bench_scoring,
+    "throughput": bench_throughput,
+    "search": bench_search,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Radar de Clientes benchmarks")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Append results as JSON lines to this file")
+    parser.add_argument("--workers", default="1,2,4", help="throughput: comma-separated worker counts")
+    parser.add_argument("--duration", type=float, default=10, help="throughput: seconds per worker count")
+    parser.add_argument("--concurrency", type=int, default=64, help="throughput: requests in flight per client")
+    parser.add_argument("--clients", type=int, default=2, help="throughput: load generator processes")
+    parser.add_argument("--path", default="/api/leads", help="throughput: endpoint to load")
+    parser.add_argument("--token", help="throughput: bearer token (default: registers a benchmark user)")
+    parser.add_argument("--revalidate", action="store_true", help="throughput: send If-None-Match, measuring the 304 path")
+    parser.add_argument("--business-id", help="search: tenant whose leads are searched")
+    args = parser.parse_args()
+
+    results = BENCHMARKS[args.benchmark](args)
+    record = {
+        "benchmark": args.benchmark,
+        "measured_at": datetime.now(timezone.utc).isoformat(),
+        "results": results,
+    }
+    print(json.dumps(record, indent=2))
+    if args.output:
+        with open(args.output, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
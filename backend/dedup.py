@@ -0,0 +1,163 @@
+"""Lead normalization and duplicate detection.
+
+The normalize_* helpers are plain Python so the insert path stays cheap.
+find_duplicate_groups works on a whole business at once with pandas
+(imported lazily): rows sharing an email are joined to the block's first
+row, and only phone blocks small enough to identify someone produce the
+candidate pairs that get the fuzzy name comparison.
+"""
+import re
+import unicodedata
+from typing import List, Optional
+
+# Leads sharing a phone are only duplicates when their names also overlap this much
+NAME_OVERLAP_THRESHOLD = 0.6
+
+# A phone shared by more leads than this is a form placeholder ("(11) 99999-9999"),
+# not a person: inside such a block only identical names are duplicates
+PHONE_BLOCK_MAX_SIZE = 50
+
+# Most advanced status wins when duplicates are merged
+STATUS_RANK = {"new": 0, "lost": 1, "contacted": 2, "qualified": 3, "converted": 4}
+
+FREE_MAIL_DOT_INSENSITIVE = {"gmail.com", "googlemail.com"}
+
+NON_DIGITS = re.compile(r"\D")
+NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+    """Brazilian phone as E.164 (+55DDNNNNNNNNN), or None if it cannot be one"""
+    raw = NON_DIGITS.sub("", phone or "")
+    digits = raw.lstrip("0")
+    if len(digits) in (12, 13) and digits.startswith("55"):
+        digits = digits[2:]
+    elif raw.startswith("0") and len(digits) in (12, 13):
+        digits = digits[2:]  # long-distance carrier code, e.g. 0 21 11 ...
+    if len(digits) == 10 and digits[2] in "6789":
+        digits = digits[:2] + "9" + digits[2:]  # mobile saved before the 9th digit
+    if "0" in digits[:2]:
+        return None
+    if (len(digits) == 11 and digits[2] == "9") or (len(digits) == 10 and digits[2] in "2345"):
+        return "+55" + digits
+    return None
+
+
+def normalize_email(email: Optional[str]) -> Optional[str]:
+    email = (email or "").strip().lower()
+    local, sep, domain = email.rpartition("@")
+    if not sep or not local or "." not in domain:
+        return None
+    local = local.split("+", 1)[0]
+    if domain in FREE_MAIL_DOT_INSENSITIVE:
+        local = local.replace(".", "")
+        domain = "gmail.com"
+    return f"{local}@{domain}" if local else None
+
+
+def fold_name(name: Optional[str]) -> str:
+    text = unicodedata.normalize("NFKD", name if isinstance(name, str) else "").encode("ascii", "ignore").decode("ascii").lower()
+    return NON_ALNUM.sub(" ", text).strip()
+
+
+def name_trigrams(folded: str) -> set:
+    padded = f"  {folded} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)} if folded else set()
+
+
+def name_overlap(a: str, b: str) -> float:
+    """Overlap coefficient of the folded names' trigrams ("Ana" vs "Ana Paula" -> 1.0)"""
+    grams_a, grams_b = name_trigrams(fold_name(a)), name_trigrams(fold_name(b))
+    if not grams_a or not grams_b:
+        return 1.0
+    return len(grams_a & grams_b) / min(len(grams_a), len(grams_b))
+
+
+def is_probable_duplicate(lead: dict, other: dict) -> bool:
+    """Same normalized email, or same normalized phone with overlapping names"""
+    email = lead.get("email_normalized")
+    if email and email == other.get("email_normalized"):
+        return True
+    phone = lead.get("phone_normalized")
+    if phone and phone == other.get("phone_normalized"):
+        return name_overlap(lead.get("name"), other.get("name")) >= NAME_OVERLAP_THRESHOLD
+    return False
+
+
+def normalize_frame(df):
+    """Add phone_normalized / email_normalized, normalizing each distinct value once"""
+    import pandas as pd
+
+    for column, normalize in (("phone", normalize_phone), ("email", normalize_email)):
+        values = df[column].astype(object).where(df[column].notna(), None)
+        normalized = {value: normalize(value) for value in pd.unique(values)}
+        # object dtype keeps invalid values as None (not NaN) for the DB round-trip
+        df[f"{column}_normalized"] = pd.Series([normalized[value] for value in values], index=df.index, dtype=object)
+    return df
+
+
+def find_duplicate_groups(leads: List[dict]) -> List[List[dict]]:
+    """Group probable duplicates; each group is sorted oldest first (the survivor)"""
+    import pandas as pd
+
+    if not leads:
+        return []
+    df = normalize_frame(pd.DataFrame(leads))
+    df["_row"] = range(len(df))
+
+    # Candidate pairs come only from rows sharing a blocking key
+    parent = list(range(len(df)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(rows_a, rows_b):
+        for a, b in zip(rows_a, rows_b):
+            root_a, root_b = find(int(a)), find(int(b))
+            if root_a != root_b:
+                parent[root_b] = root_a
+
+    def shared(key):
+        return df.loc[df[key].notna() & df[key].duplicated(keep=False), [key, "_row", "name"]]
+
+    # Same email: every row joins the first of its block, no pairs needed
+    emails = shared("email_normalized")
+    union(emails.groupby("email_normalized")["_row"].transform("first").to_numpy(), emails["_row"].to_numpy())
+
+    phones = shared("phone_normalized")
+    small = phones.groupby("phone_normalized")["_row"].transform("size") <= PHONE_BLOCK_MAX_SIZE
+    pairs = phones[small].merge(phones[small], on="phone_normalized", suffixes=("_a", "_b"))
+    pairs = pairs[pairs["_row_a"] < pairs["_row_b"]]
+    overlap = [name_overlap(a, b) >= NAME_OVERLAP_THRESHOLD for a, b in zip(pairs["name_a"], pairs["name_b"])]
+    pairs = pairs[pd.Series(overlap, index=pairs.index, dtype=bool)]
+    union(pairs["_row_a"].to_numpy(), pairs["_row_b"].to_numpy())
+
+    placeholders = phones[~small].assign(folded=[fold_name(name) for name in phones.loc[~small, "name"]])
+    placeholders = placeholders[placeholders["folded"] != ""]
+    firsts = placeholders.groupby(["phone_normalized", "folded"])["_row"].transform("first")
+    union(firsts.to_numpy(), placeholders["_row"].to_numpy())
+
+    roots = pd.Series([find(i) for i in range(len(df))])
+    grouped = roots[roots.duplicated(keep=False)]
+    phones, emails = df["phone_normalized"].to_numpy(), df["email_normalized"].to_numpy()
+    groups = []
+    for _, rows in grouped.groupby(grouped):
+        # Only grouped rows are materialized back into dicts
+        members = [{**leads[i], "phone_normalized": phones[i], "email_normalized": emails[i]} for i in rows.index]
+        groups.append(sorted(members, key=lambda lead: str(lead.get("created_at") or "")))
+    return groups
+
+
+def merge_group(group: List[dict]):
+    """Survivor row (oldest, gaps filled from the others) and the ids to delete"""
+    survivor = dict(group[0])
+    for other in group[1:]:
+        for field in ("email", "phone", "interest", "email_normalized", "phone_normalized"):
+            if not survivor.get(field) and other.get(field):
+                survivor[field] = other[field]
+        if STATUS_RANK.get(other.get("status"), 0) > STATUS_RANK.get(survivor.get("status"), 0):
+            survivor["status"] = other["status"]
+    return survivor, [other["id"] for other in group[1:]]
@@ -0,0 +1,303 @@
+"""Maintenance jobs for the Radar de Clientes API.
+
+Run from the backend folder:
+
+    python jobs.py backfill-rollups [--business-id ID]
+    python jobs.py dedup-leads [--business-id ID] [--apply]
+    python jobs.py score-leads [--business-id ID]
+    python jobs.py archive [--business-id ID] [--table TABLE] [--dry-run]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import uuid
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+import orjson
+
+from dedup import find_duplicate_groups, merge_group, normalize_frame
+from scoring import page_conversion_rates, score_frame
+from server import shared_state, supabase, version_stamps
+
+PAGE_SIZE = 1000
+
+# Rows older than their retention go to Parquet files under ARCHIVE_DIR (0 days disables a table)
+ARCHIVE_DIR = Path(os.environ.get('ARCHIVE_DIR', Path(__file__).parent / 'archive'))
+RETENTION_DAYS = {
+    "insights": int(os.environ.get('INSIGHT_RETENTION_DAYS', '90')),
+    "reports": int(os.environ.get('REPORT_RETENTION_DAYS', '365')),
+    # Leads are archived only on request, and only once they are closed
+    "leads": int(os.environ.get('LEAD_RETENTION_DAYS', '0')),
+}
+ARCHIVE_STATUSES = {"leads": ["converted", "lost"]}
+# Nested JSON is stored as text so every file of a table has the same schema
+ARCHIVE_JSON_COLUMNS = {"reports": ["data"]}
+# Column types of the archived files (pyarrow type names). Fixed so a month whose
+# column is all null still writes the same schema; unlisted columns are stored as text
+ARCHIVE_COLUMNS = {
+    "insights": {"id": "string", "type": "string", "niche": "string", "content": "string", "created_at": "string"},
+    "reports": {"id": "string", "period": "string", "data": "string", "analysis": "string", "created_at": "string"},
+    "leads": {
+        "id": "string", "name": "string", "email": "string", "phone": "string", "interest": "string",
+        "source": "string", "status": "string", "score": "float64", "phone_normalized": "string",
+        "email_normalized": "string", "created_at": "string",
+    },
+}
+# Generated columns, rebuilt by the database if the rows are ever restored
+ARCHIVE_SKIP_COLUMNS = {"leads": ["phone_digits", "search_text", "search_vector"]}
+# ETag scopes of the API that list each table
+ARCHIVE_SCOPES = {"leads": ["leads"], "reports": ["reports"]}
+# Ids per delete request; keeps the PostgREST URL short
+DELETE_CHUNK_SIZE = 200
+LEAD_JOB_COLUMNS = "id,business_id,name,email,phone,interest,source,status,score,created_at,phone_normalized,email_normalized"
+
+
+def iter_business_ids(business_id=None):
+    if business_id:
+        yield business_id
+        return
+    offset = 0
+    while True:
+        result = supabase.table("businesses").select("id").order("id").range(offset, offset + PAGE_SIZE - 1).execute()
+        for row in result.data or []:
+            yield row["id"]
+        if not result.data or len(result.data) < PAGE_SIZE:
+            return
+        offset += PAGE_SIZE
+
+
+def load_leads(business_id):
+    leads = []
+    while True:
+        offset = len(leads)
+        result = supabase.table("leads").select(LEAD_JOB_COLUMNS).eq("business_id", business_id).order("id").range(offset, offset + PAGE_SIZE - 1).execute()
+        leads.extend(result.data or [])
+        if not result.data or len(result.data) < PAGE_SIZE:
+            return leads
+
+
+def bump_versions(business_id, scopes):
+    """Invalidate the API's ETags for rows changed by a job"""
+    if not shared_state.is_shared:
+        return
+
+    async def bump():
+        try:
+            await version_stamps.bump(business_id, *scopes)
+            if version_stamps.pending:
+                logging.warning(f"Negócio {business_id}: estado compartilhado indisponível, reinicie a API para invalidar os ETags")
+                version_stamps.pending.clear()
+        finally:
+            await shared_state.stop()
+
+    asyncio.run(bump())
+
+
+def warn_without_shared_state():
+    if not shared_state.is_shared:
+        # The stamps live in the API process; a restart starts a new ETag epoch
+        logging.warning("Sem SHARED_STATE_URL a API não vê as mudanças deste job: reinicie-a para invalidar os ETags")
+
+
+def backfill_rollups(args):
+    # One business per call keeps each rebuild transaction small
+    count = 0
+    for business_id in iter_business_ids(args.business_id):
+        supabase.rpc("backfill_rollups", {"p_business_id": business_id}).execute()
+        count += 1
+        logging.info(f"Rollups reconstruídos para o negócio {business_id}")
+    logging.info(f"Backfill concluído: {count} negócio(s)")
+
+
+def dedup_leads(args):
+    import pandas as pd
+
+    if args.apply:
+        warn_without_shared_state()
+    for business_id in iter_business_ids(args.business_id):
+        leads = load_leads(business_id)
+        if not leads:
+            continue
+
+        # Fill the normalized columns the insert-time check relies on. Only those two
+        # columns are written: an upsert of the loaded rows would re-insert leads deleted
+        # meanwhile and revert concurrent edits
+        frame = normalize_frame(pd.DataFrame(leads))
+        stale = [
+            (lead["id"], phone, email)
+            for lead, phone, email in zip(leads, frame["phone_normalized"], frame["email_normalized"])
+            if (lead.get("phone_normalized"), lead.get("email_normalized")) != (phone, email)
+        ]
+        for start in range(0, len(stale), PAGE_SIZE):
+            ids, phones, emails = zip(*stale[start:start + PAGE_SIZE])
+            supabase.rpc("set_lead_contacts", {"p_ids": list(ids), "p_phones": list(phones), "p_emails": list(emails)}).execute()
+
+        groups = find_duplicate_groups(leads)
+        duplicates = sum(len(group) - 1 for group in groups)
+        logging.info(f"Negócio {business_id}: {len(leads)} leads, {len(stale)} normalizados, {len(groups)} grupos com {duplicates} duplicados")
+        if not args.apply:
+            continue
+
+        for group in groups:
+            survivor, duplicate_ids = merge_group(group)
+            supabase.table("leads").update({
+                field: survivor.get(field)
+                for field in ("email", "phone", "interest", "status", "phone_normalized", "email_normalized")
+            }).eq("id", survivor["id"]).execute()
+            supabase.table("leads").delete().in_("id", duplicate_ids).execute()
+        # /leads, search and the dashboard would otherwise answer 304 with the merged leads
+        if groups:
+            bump_versions(business_id, ["leads"])
+        logging.info(f"Negócio {business_id}: {duplicates} leads duplicados mesclados")
+
+
+def score_leads(args):
+    import pandas as pd
+
+    warn_without_shared_state()
+    for business_id in iter_business_ids(args.business_id):
+        leads = load_leads(business_id)
+        if not leads:
+            continue
+        pages = supabase.table("landing_pages").select("slug,visits,conversions").eq("business_id", business_id).execute()
+        frame = score_frame(pd.DataFrame(leads), page_conversion_rates(pages.data or []))
+
+        # Only rows whose score moved are written back, and only their score column
+        changed = [
+            (lead["id"], score)
+            for lead, score in zip(leads, frame["score"].tolist())
+            if lead.get("score") is None or abs(lead["score"] - score) >= 0.1
+        ]
+        for start in range(0, len(changed), PAGE_SIZE):
+            ids, scores = zip(*changed[start:start + PAGE_SIZE])
+            supabase.rpc("set_lead_scores", {"p_ids": list(ids), "p_scores": list(scores)}).execute()
+        # Scores and the ?sort=score order are part of the leads ETag
+        if changed:
+            bump_versions(business_id, ["leads"])
+        logging.info(f"Negócio {business_id}: {len(leads)} leads, {len(changed)} scores atualizados")
+
+
+def load_expired(table, business_id, cutoff):
+    rows = []
+    while True:
+        query = supabase.table(table).select("*").eq("business_id", business_id).lt("created_at", cutoff)
+        if table in ARCHIVE_STATUSES:
+            query = query.in_("status", ARCHIVE_STATUSES[table])
+        offset = len(rows)
+        result = query.order("id").range(offset, offset + PAGE_SIZE - 1).execute()
+        rows.extend(result.data or [])
+        if not result.data or len(result.data) < PAGE_SIZE:
+            return rows
+
+
+def archive_schema(table, columns):
+    import pyarrow as pa
+
+    types = ARCHIVE_COLUMNS[table]
+    extra = sorted(column for column in columns if column not in types)
+    return pa.schema([(column, getattr(pa, kind)()) for column, kind in types.items()] + [(column, pa.string()) for column in extra])
+
+
+def as_text(value):
+    return value if value is None or isinstance(value, str) else orjson.dumps(value).decode()
+
+
+def write_archive(table, business_id, rows):
+    """One zstd Parquet file per month of created_at, partitioned by business; returns the files"""
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # business_id comes back from the directory name when the dataset is read
+    frame = pd.DataFrame(rows).drop(columns=["business_id", *ARCHIVE_SKIP_COLUMNS.get(table, [])], errors="ignore")
+    for column in ARCHIVE_JSON_COLUMNS.get(table, []):
+        frame[column] = [orjson.dumps(value).decode() for value in frame[column]]
+    schema = archive_schema(table, frame.columns)
+    for column in frame.columns:
+        if column not in ARCHIVE_COLUMNS[table]:
+            frame[column] = [as_text(value) for value in frame[column]]
+    frame = frame.reindex(columns=schema.names)
+    run_id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+    paths = []
+    for month, part in frame.groupby(frame["created_at"].str[:7]):
+        path = ARCHIVE_DIR / table / f"business_id={business_id}" / f"month={month}" / f"part-{run_id}.parquet"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        pq.write_table(pa.Table.from_pandas(part, schema=schema, preserve_index=False), path, compression="zstd")
+        # Rows are only deleted once the file reads back complete
+        if pq.read_metadata(path).num_rows != len(part):
+            raise RuntimeError(f"Arquivo incompleto: {path}")
+        paths.append(path)
+    return paths
+
+
+def delete_archived(table, ids):
+    for start in range(0, len(ids), DELETE_CHUNK_SIZE):
+        chunk = ids[start:start + DELETE_CHUNK_SIZE]
+        if table == "leads":
+            # Keeps the analytics rollups, see migrations/005_retention.sql
+            supabase.rpc("archive_delete_leads", {"p_ids": chunk}).execute()
+        else:
+            supabase.table(table).delete().in_("id", chunk).execute()
+
+
+def archive(args):
+    tables = [args.table] if args.table else list(RETENTION_DAYS)
+    now = datetime.now(timezone.utc)
+    if not args.dry_run:
+        warn_without_shared_state()
+    for table in tables:
+        if RETENTION_DAYS[table] <= 0:
+            logging.info(f"{table}: retenção desativada")
+            continue
+        cutoff = (now - timedelta(days=RETENTION_DAYS[table])).isoformat()
+        total = 0
+        for business_id in iter_business_ids(args.business_id):
+            rows = load_expired(table, business_id, cutoff)
+            if not rows:
+                continue
+            total += len(rows)
+            if args.dry_run:
+                continue
+            paths = write_archive(table, business_id, rows)
+            delete_archived(table, [row["id"] for row in rows])
+            # /reports/history would otherwise keep answering 304 with the archived reports
+            if table in ARCHIVE_SCOPES:
+                bump_versions(business_id, ARCHIVE_SCOPES[table])
+            logging.info(f"{table}: {len(rows)} linhas do negócio {business_id} arquivadas em {len(paths)} arquivo(s)")
+        action = "a arquivar" if args.dry_run else "arquivadas"
+        logging.info(f"{table}: {total} linhas anteriores a {cutoff[:10]} {action}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Radar de Clientes jobs")
+    subparsers = parser.add_subparsers(dest="job", required=True)
+
+    backfill = subparsers.add_parser("backfill-rollups", help="Rebuild lead/page rollups from source tables")
+    backfill.add_argument("--business-id")
+    backfill.set_defaults(run=backfill_rollups)
+
+    dedup = subparsers.add_parser("dedup-leads", help="Normalize contacts and merge probable duplicate leads")
+    dedup.add_argument("--business-id")
+    dedup.add_argument("--apply", action="store_true", help="Merge the groups found (default: report only)")
+    dedup.set_defaults(run=dedup_leads)
+
+    score = subparsers.add_parser("score-leads", help="Recompute lead scores (run daily so recency decays)")
+    score.add_argument("--business-id")
+    score.set_defaults(run=score_leads)
+
+    archive_parser = subparsers.add_parser("archive", help="Move rows past their retention to Parquet files")
+    archive_parser.add_argument("--business-id")
+    archive_parser.add_argument("--table", choices=sorted(RETENTION_DAYS))
+    archive_parser.add_argument("--dry-run", action="store_true", help="Only count the rows that would be archived")
+    archive_parser.set_defaults(run=archive)
+
+    args = parser.parse_args()
+    args.run(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+-- Hourly/daily rollups for lead and landing page analytics.
+-- Apply in the Supabase SQL editor (or psql) before deploying the
+-- /api/reports/timeseries endpoint, then run: python jobs.py backfill-rollups
+
+create table if not exists lead_rollups (
+    business_id text not null,
+    granularity text not null check (granularity in ('hour', 'day')),
+    bucket_start timestamptz not null,
+    source text not null,
+    status text not null,
+    leads integer not null default 0,
+    primary key (business_id, granularity, bucket_start, source, status)
+);
+
+create table if not exists page_rollups (
+    business_id text not null,
+    page_id text not null,
+    granularity text not null check (granularity in ('hour', 'day')),
+    bucket_start timestamptz not null,
+    visits integer not null default 0,
+    conversions integer not null default 0,
+    primary key (business_id, page_id, granularity, bucket_start)
+);
+
+-- Range scans per business always filter on granularity and bucket_start
+create index if not exists page_rollups_range_idx
+    on page_rollups (business_id, granularity, bucket_start);
+
+create or replace function rollup_bucket(granularity text, ts timestamptz)
+returns timestamptz language sql immutable as $$
+    select date_trunc(granularity, ts at time zone 'UTC') at time zone 'UTC'
+$$;
+
+create or replace function bump_lead_rollup(
+    p_business_id text, p_created_at timestamptz, p_source text, p_status text, p_delta integer
+) returns void language plpgsql as $$
+declare
+    g text;
+begin
+    foreach g in array array['hour', 'day'] loop
+        insert into lead_rollups (business_id, granularity, bucket_start, source, status, leads)
+        values (p_business_id, g, rollup_bucket(g, p_created_at), coalesce(p_source, 'manual'), coalesce(p_status, 'new'), p_delta)
+        on conflict (business_id, granularity, bucket_start, source, status)
+        do update set leads = lead_rollups.leads + excluded.leads;
+    end loop;
+end;
+$$;
+
+create or replace function bump_page_rollup(
+    p_business_id text, p_page_id text, p_at timestamptz, p_visits integer, p_conversions integer
+) returns void language plpgsql as $$
+declare
+    g text;
+begin
+    foreach g in array array['hour', 'day'] loop
+        insert into page_rollups (business_id, page_id, granularity, bucket_start, visits, conversions)
+        values (p_business_id, p_page_id, g, rollup_bucket(g, p_at), p_visits, p_conversions)
+        on conflict (business_id, page_id, granularity, bucket_start)
+        do update set visits = page_rollups.visits + excluded.visits,
+                      conversions = page_rollups.conversions + excluded.conversions;
+    end loop;
+end;
+$$;
+
+-- Leads are bucketed by created_at; a status change moves the lead between status rows
+create or replace function leads_rollup_trigger() returns trigger language plpgsql as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform bump_lead_rollup(old.business_id::text, old.created_at::timestamptz, old.source, old.status, -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform bump_lead_rollup(new.business_id::text, new.created_at::timestamptz, new.source, new.status, 1);
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists leads_rollup on leads;
+create trigger leads_rollup
+    after insert or delete or update of status, source, created_at on leads
+    for each row execute function leads_rollup_trigger();
+
+-- Visits and conversions are counters on landing_pages; bucket each increment at write time
+create or replace function landing_pages_rollup_trigger() returns trigger language plpgsql as $$
+begin
+    if new.visits is distinct from old.visits or new.conversions is distinct from old.conversions then
+        perform bump_page_rollup(
+            new.business_id::text, new.id::text, now(),
+            coalesce(new.visits, 0) - coalesce(old.visits, 0),
+            coalesce(new.conversions, 0) - coalesce(old.conversions, 0)
+        );
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists landing_pages_rollup on landing_pages;
+create trigger landing_pages_rollup
+    after update of visits, conversions on landing_pages
+    for each row execute function landing_pages_rollup_trigger();
+
+-- Rebuilds the rollups of one business (or all) from the source tables.
+-- Historical visits are not recoverable (landing_pages only keeps totals),
+-- so page backfill only restores conversions from landing page leads.
+create or replace function backfill_rollups(p_business_id text default null)
+returns void language plpgsql as $$
+begin
+    delete from lead_rollups where p_business_id is null or business_id = p_business_id;
+
+    insert into lead_rollups (business_id, granularity, bucket_start, source, status, leads)
+    select l.business_id::text, g.granularity, rollup_bucket(g.granularity, l.created_at::timestamptz),
+           coalesce(l.source, 'manual'), coalesce(l.status, 'new'), count(*)
+    from leads l
+    cross join (values ('hour'), ('day')) as g(granularity)
+    where p_business_id is null or l.business_id::text = p_business_id
+    group by 1, 2, 3, 4, 5;
+
+    update page_rollups set conversions = 0
+    where p_business_id is null or business_id = p_business_id;
+
+    insert into page_rollups (business_id, page_id, granularity, bucket_start, visits, conversions)
+    select p.business_id::text, p.id::text, g.granularity, rollup_bucket(g.granularity, l.created_at::timestamptz), 0, count(*)
+    from leads l
+    join landing_pages p on l.source = 'landing_page:' || p.slug
+    cross join (values ('hour'), ('day')) as g(granularity)
+    where p_business_id is null or p.business_id::text = p_business_id
+    group by 1, 2, 3, 4
+    on conflict (business_id, page_id, granularity, bucket_start)
+    do update set conversions = excluded.conversions;
+end;
+$$;
@@ -0,0 +1,73 @@
+-- Indexed server-side lead search (/api/leads/search).
+-- Generated columns keep the normalized search text in sync on every write.
+
+create extension if not exists pg_trgm;
+create extension if not exists unaccent;
+create extension if not exists btree_gin;
+
+-- unaccent() is only STABLE; pinning the dictionary makes it safe for generated columns
+create or replace function immutable_unaccent(text)
+returns text language sql immutable parallel safe strict as $$
+    select public.unaccent('public.unaccent'::regdictionary, $1)
+$$;
+
+alter table leads add column if not exists phone_digits text
+    generated always as (regexp_replace(coalesce(phone, ''), '\D', '', 'g')) stored;
+
+alter table leads add column if not exists search_text text
+    generated always as (
+        lower(immutable_unaccent(coalesce(name, '') || ' ' || coalesce(email, '') || ' ' || coalesce(interest, '')))
+    ) stored;
+
+alter table leads add column if not exists search_vector tsvector
+    generated always as (
+        to_tsvector('simple', lower(immutable_unaccent(coalesce(name, '') || ' ' || coalesce(email, '') || ' ' || coalesce(interest, ''))))
+    ) stored;
+
+-- business_id leads every index so each tenant only scans its own entries
+create index if not exists leads_search_trgm_idx on leads using gin (business_id, search_text gin_trgm_ops);
+create index if not exists leads_search_fts_idx on leads using gin (business_id, search_vector);
+create index if not exists leads_phone_digits_trgm_idx on leads using gin (business_id, phone_digits gin_trgm_ops);
+create index if not exists leads_business_status_created_idx on leads (business_id, status, created_at desc);
+create index if not exists leads_business_created_idx on leads (business_id, created_at desc);
+
+-- Ranked search: full-text hits, substring/word-similarity matches on name/email/interest
+-- and partial phone digits. Returns the LeadResponse columns plus "rank" as JSON.
+create or replace function search_leads(
+    p_business_id text,
+    p_query text,
+    p_status text default null,
+    p_limit integer default 20,
+    p_offset integer default 0
+) returns setof jsonb language sql stable as $$
+    with q as (
+        select lower(immutable_unaccent(trim(p_query))) as text,
+               plainto_tsquery('simple', lower(immutable_unaccent(trim(p_query)))) as tsq,
+               regexp_replace(p_query, '\D', '', 'g') as digits
+    ), matches as (
+        select l.*,
+               greatest(
+                   ts_rank(l.search_vector, q.tsq),
+                   word_similarity(q.text, l.search_text),
+                   case when length(q.digits) >= 4 and l.phone_digits like '%' || q.digits || '%' then 1 else 0 end
+               ) as rank
+        from leads l, q
+        -- Resolve the id with the column's own type so the composite indexes apply
+        where l.business_id = (select b.id from businesses b where b.id::text = p_business_id)
+          and (p_status is null or l.status = p_status)
+          and (
+              l.search_vector @@ q.tsq
+              or l.search_text like '%' || q.text || '%'
+              or q.text <% l.search_text
+              or (length(q.digits) >= 4 and l.phone_digits like '%' || q.digits || '%')
+          )
+    )
+    select jsonb_build_object(
+        'id', id, 'business_id', business_id, 'name', name, 'email', email, 'phone', phone,
+        'interest', interest, 'source', source, 'status', status, 'created_at', created_at,
+        'rank', round(rank::numeric, 4)
+    )
+    from matches
+    order by rank desc, created_at desc
+    limit p_limit offset p_offset
+$$;
@@ -0,0 +1,10 @@
+-- Normalized contact columns used to detect duplicate leads on insert.
+-- Existing rows are filled by: python jobs.py dedup-leads
+
+alter table leads add column if not exists phone_normalized text;
+alter table leads add column if not exists email_normalized text;
+
+create index if not exists leads_business_phone_normalized_idx
+    on leads (business_id, phone_normalized) where phone_normalized is not null;
+create index if not exists leads_business_email_normalized_idx
+    on leads (business_id, email_normalized) where email_normalized is not null;
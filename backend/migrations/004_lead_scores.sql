@@ -0,0 +1,48 @@
+-- Stored lead scores so /api/leads?sort=score is an index scan.
+-- New leads are scored on insert; existing rows (and the recency decay) are
+-- refreshed by: python jobs.py score-leads
+
+alter table leads add column if not exists score real;
+
+create index if not exists leads_business_score_idx
+    on leads (business_id, score desc nulls last, created_at desc);
+
+-- search_leads (002) now also returns the score
+create or replace function search_leads(
+    p_business_id text,
+    p_query text,
+    p_status text default null,
+    p_limit integer default 20,
+    p_offset integer default 0
+) returns setof jsonb language sql stable as $$
+    with q as (
+        select lower(immutable_unaccent(trim(p_query))) as text,
+               plainto_tsquery('simple', lower(immutable_unaccent(trim(p_query)))) as tsq,
+               regexp_replace(p_query, '\D', '', 'g') as digits
+    ), matches as (
+        select l.*,
+               greatest(
+                   ts_rank(l.search_vector, q.tsq),
+                   word_similarity(q.text, l.search_text),
+                   case when length(q.digits) >= 4 and l.phone_digits like '%' || q.digits || '%' then 1 else 0 end
+               ) as rank
+        from leads l, q
+        -- Resolve the id with the column's own type so the composite indexes apply
+        where l.business_id = (select b.id from businesses b where b.id::text = p_business_id)
+          and (p_status is null or l.status = p_status)
+          and (
+              l.search_vector @@ q.tsq
+              or l.search_text like '%' || q.text || '%'
+              or q.text <% l.search_text
+              or (length(q.digits) >= 4 and l.phone_digits like '%' || q.digits || '%')
+          )
+    )
+    select jsonb_build_object(
+        'id', id, 'business_id', business_id, 'name', name, 'email', email, 'phone', phone,
+        'interest', interest, 'source', source, 'status', status, 'score', score,
+        'created_at', created_at, 'rank', round(rank::numeric, 4)
+    )
+    from matches
+    order by rank desc, created_at desc
+    limit p_limit offset p_offset
+$$;
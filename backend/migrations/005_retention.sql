@@ -0,0 +1,41 @@
+-- Retention and archival (python jobs.py archive).
+-- Archived leads leave the table without leaving the analytics rollups:
+-- archive_delete_leads flags its transaction and the rollup trigger skips
+-- the decrement for those deletes.
+
+create or replace function leads_rollup_trigger() returns trigger language plpgsql as $$
+begin
+    if tg_op = 'DELETE' and current_setting('radar.archiving', true) = 'on' then
+        return null;
+    end if;
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform bump_lead_rollup(old.business_id::text, old.created_at::timestamptz, old.source, old.status, -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform bump_lead_rollup(new.business_id::text, new.created_at::timestamptz, new.source, new.status, 1);
+    end if;
+    return null;
+end;
+$$;
+
+-- SQL type of a column. Functions taking text ids cast them to it in dynamic
+-- queries (006, 008, 009 too), so the primary key index applies whatever the id type
+create or replace function column_type(p_table regclass, p_column name)
+returns text language sql stable as $$
+    select format_type(atttypid, atttypmod) from pg_attribute where attrelid = p_table and attname = p_column
+$$;
+
+create or replace function archive_delete_leads(p_ids text[]) returns integer language plpgsql as $$
+declare
+    deleted integer;
+begin
+    perform set_config('radar.archiving', 'on', true);
+    execute format('delete from leads where id = any($1::%s[])', column_type('leads', 'id')) using p_ids;
+    get diagnostics deleted = row_count;
+    return deleted;
+end;
+$$;
+
+-- Expiry scans and the metadata-only report history
+create index if not exists insights_business_created_idx on insights (business_id, created_at);
+create index if not exists reports_business_created_idx on reports (business_id, created_at desc);
@@ -0,0 +1,19 @@
+-- Landing page counters flushed in batches by the leader worker.
+-- Workers buffer visits/conversions in the shared state; the leader sends the
+-- accumulated deltas here, so no worker overwrites another's read-modify-write.
+-- The page rollup trigger (001) still sees each update as a delta.
+
+create or replace function increment_page_counters(p_counters jsonb)
+returns table (page_id text, business_id text) language plpgsql as $$
+begin
+    return query execute format(
+        'update landing_pages lp
+            set visits = lp.visits + c.visits,
+                conversions = lp.conversions + c.conversions
+           from jsonb_to_recordset($1) as c(id text, visits integer, conversions integer)
+          where lp.id = c.id::%s
+      returning lp.id::text, lp.business_id::text',
+        column_type('landing_pages', 'id')
+    ) using p_counters;
+end;
+$$;
@@ -0,0 +1,65 @@
+-- Lead search plans (replaces search_leads from 002/004).
+-- Each call plans its queries with the actual values (EXECUTE):
+--   * the phone branch only exists when the query has 4+ digits; a query
+--     without digits no longer plans phone_digits like '%%' on the GIN index
+--   * only the most recent matches (500, or more for deep pages) are ranked,
+--     so broad terms ("silva") do not score every match of the tenant
+--   * fuzzy word similarity (typos) only runs when the exact branches
+--     (full text, substring, phone) do not fill the requested page
+
+create or replace function search_leads(
+    p_business_id text,
+    p_query text,
+    p_status text default null,
+    p_limit integer default 20,
+    p_offset integer default 0
+) returns setof jsonb language plpgsql stable as $$
+declare
+    v_text text := lower(immutable_unaccent(trim(p_query)));
+    v_digits text := regexp_replace(p_query, '\D', '', 'g');
+    v_wanted integer := p_offset + p_limit;
+    -- The id keeps the column's own type so the composite indexes apply
+    v_business_id leads.business_id%type;
+    v_exact text := 'l.search_vector @@ plainto_tsquery(''simple'', $2) or l.search_text like ''%%'' || $2 || ''%%''';
+    v_candidates text := 'select coalesce(array_agg(id), ''{}'') from (
+                              select l.id from leads l
+                              where l.business_id = $1 and ($4::text is null or l.status = $4) and (%s)
+                              order by l.created_at desc
+                              limit $5
+                          ) matches';
+    v_ids leads.id%type[];
+    v_fuzzy_ids leads.id%type[];
+begin
+    select b.id into v_business_id from businesses b where b.id::text = p_business_id;
+    if length(v_digits) >= 4 then
+        v_exact := v_exact || ' or l.phone_digits like ''%%'' || $3 || ''%%''';
+    end if;
+
+    execute format(v_candidates, v_exact)
+        into v_ids using v_business_id, v_text, v_digits, p_status, greatest(500, v_wanted);
+    if cardinality(v_ids) < v_wanted then
+        execute format(v_candidates, '$2 <% l.search_text and l.id <> all($6)')
+            into v_fuzzy_ids using v_business_id, v_text, v_digits, p_status, v_wanted - cardinality(v_ids), v_ids;
+        v_ids := v_ids || v_fuzzy_ids;
+    end if;
+
+    return query
+        select jsonb_build_object(
+            'id', ranked.id, 'business_id', ranked.business_id, 'name', ranked.name, 'email', ranked.email,
+            'phone', ranked.phone, 'interest', ranked.interest, 'source', ranked.source, 'status', ranked.status,
+            'score', ranked.score, 'created_at', ranked.created_at, 'rank', round(ranked.rank::numeric, 4)
+        )
+        from (
+            select l.*,
+                   greatest(
+                       ts_rank(l.search_vector, plainto_tsquery('simple', v_text)),
+                       word_similarity(v_text, l.search_text),
+                       case when length(v_digits) >= 4 and l.phone_digits like '%' || v_digits || '%' then 1 else 0 end
+                   ) as rank
+            from leads l
+            where l.id = any(v_ids)
+        ) ranked
+        order by ranked.rank desc, ranked.created_at desc
+        limit p_limit offset p_offset;
+end;
+$$;
@@ -0,0 +1,18 @@
+-- Bulk update of the normalized contact columns only, for python jobs.py dedup-leads.
+
+create or replace function set_lead_contacts(p_ids text[], p_phones text[], p_emails text[])
+returns integer language plpgsql as $$
+declare
+    updated integer;
+begin
+    execute format(
+        'update leads l
+            set phone_normalized = c.phone, email_normalized = c.email
+           from unnest($1::%s[], $2, $3) as c(id, phone, email)
+          where l.id = c.id',
+        column_type('leads', 'id')
+    ) using p_ids, p_phones, p_emails;
+    get diagnostics updated = row_count;
+    return updated;
+end;
+$$;
@@ -0,0 +1,18 @@
+-- Bulk update of the score column only, for python jobs.py score-leads.
+
+create or replace function set_lead_scores(p_ids text[], p_scores real[])
+returns integer language plpgsql as $$
+declare
+    updated integer;
+begin
+    execute format(
+        'update leads l
+            set score = s.score
+           from unnest($1::%s[], $2) as s(id, score)
+          where l.id = s.id',
+        column_type('leads', 'id')
+    ) using p_ids, p_scores;
+    get diagnostics updated = row_count;
+    return updated;
+end;
+$$;
@@ -0,0 +1,196 @@
+"""Niche and city canonicalization.
+
+Free-text niches ("Barbearia", "barbearia masculina", "barber shop") are
+mapped to one canonical key so AI results generated for one business can
+be reused by every business in the same niche and city. Everything here is
+local: accent/case folding, a synonym table and character trigram
+similarity against an index built at import time.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Optional, Tuple
+
+# key -> (label used in prompts, synonyms); keys match the onboarding niche values
+CANONICAL_NICHES = {
+    "salao_beleza": ("Salão de Beleza", [
+        "salao", "salao de beleza", "cabeleireiro", "cabeleireira", "cabelereiro", "hair salon",
+        "beauty salon", "manicure", "pedicure", "esmalteria", "design de sobrancelhas", "studio de beleza",
+    ]),
+    "barbearia": ("Barbearia", [
+        "barbeiro", "barber", "barber shop", "barbershop", "barbearia masculina", "corte masculino",
+    ]),
+    "clinica_estetica": ("Clínica de Estética", [
+        "estetica", "clinica de estetica", "esteticista", "estetica facial", "estetica corporal",
+        "depilacao", "depilacao a laser", "harmonizacao facial", "spa", "massagem", "drenagem linfatica",
+        "limpeza de pele",
+    ]),
+    "restaurante": ("Restaurante/Café", [
+        "restaurante", "cafe", "cafeteria", "lanchonete", "hamburgueria", "pizzaria", "bar",
+        "padaria", "confeitaria", "doceria", "food truck", "marmitaria", "delivery de comida", "coffee shop",
+    ]),
+    "loja_roupas": ("Loja de Roupas", [
+        "roupas", "loja de roupa", "moda", "moda feminina", "moda masculina", "moda infantil",
+        "boutique", "brecho", "vestuario", "clothing store", "calcados", "sapataria",
+    ]),
+    "loja_geral": ("Loja/Comércio", [
+        "loja", "comercio", "varejo", "mercadinho", "mercado", "minimercado", "conveniencia",
+        "papelaria", "loja de presentes", "utilidades", "armarinho", "pet shop", "farmacia",
+    ]),
+    "servicos_gerais": ("Prestador de Serviços", [
+        "servicos", "prestador de servicos", "eletricista", "encanador", "pedreiro", "pintor",
+        "marido de aluguel", "reformas", "manutencao", "limpeza", "limpeza residencial", "diarista", "jardinagem",
+        "assistencia tecnica", "chaveiro", "freelancer",
+    ]),
+}
+
+# Single words that only name a niche on their own: "salao" alone is a beauty
+# salon, "salao de festas" is not. They match exactly, never inside longer text
+GENERIC_ALIASES = {
+    "salao", "estetica", "spa", "mercado", "limpeza", "loja", "comercio", "varejo", "servicos", "manutencao",
+}
+
+# Words that move a niche somewhere else ("estetica automotiva", "spa pet");
+# text containing one keeps its own key unless an alias covers the word
+BLOCKING_QUALIFIERS = {
+    "festa", "festas", "evento", "eventos", "buffet",
+    "automotiva", "automotivo", "automotivos", "veicular", "veiculos", "carro", "carros", "moto", "motos",
+    "imobiliaria", "imobiliario", "imoveis", "pet", "pets", "animal", "animais", "veterinaria", "veterinario",
+}
+
+# Common abbreviations and nicknames -> folded city name
+CITY_ALIASES = {
+    "sp": "sao paulo", "sampa": "sao paulo", "sao paulo capital": "sao paulo",
+    "rj": "rio de janeiro", "rio": "rio de janeiro",
+    "bh": "belo horizonte", "beaga": "belo horizonte",
+    "poa": "porto alegre", "bsb": "brasilia", "df": "brasilia",
+    "ssa": "salvador", "cwb": "curitiba", "floripa": "florianopolis",
+    "rec": "recife", "for": "fortaleza", "bel": "belem",
+}
+
+# Folded city name -> label for prompts, for names folding cannot restore
+CITY_LABELS = {
+    "sao paulo": "São Paulo", "rio de janeiro": "Rio de Janeiro", "belo horizonte": "Belo Horizonte",
+    "porto alegre": "Porto Alegre", "brasilia": "Brasília", "salvador": "Salvador", "curitiba": "Curitiba",
+    "florianopolis": "Florianópolis", "recife": "Recife", "fortaleza": "Fortaleza", "belem": "Belém",
+}
+
+# Lowercase inside a city label ("São José dos Campos")
+CITY_CONNECTORS = {"de", "da", "do", "das", "dos", "e"}
+
+STATE_CODES = {
+    "ac", "al", "ap", "am", "ba", "ce", "df", "es", "go", "ma", "mt", "ms", "mg", "pa",
+    "pb", "pr", "pe", "pi", "rj", "rn", "rs", "ro", "rr", "sc", "sp", "se", "to",
+}
+
+# Words that qualify a niche without changing it ("barbearia do João")
+STOPWORDS = {"de", "da", "do", "das", "dos", "e", "em", "para", "a", "o", "the", "and", "of", "loja"}
+
+# Minimum trigram similarity for a fuzzy match; below it the niche keeps its own key
+NICHE_SIMILARITY_THRESHOLD = 0.55
+
+NON_ALNUM = re.compile(r"[^a-z0-9]+")
+CITY_WORD = re.compile(r"[^\W_]+(?:['-][^\W_]+)*")
+
+
+def fold(text: Optional[str]) -> str:
+    """Lowercase, accent-free, single-spaced ("Salão_de Beleza" -> "salao de beleza")"""
+    text = unicodedata.normalize("NFKD", text if isinstance(text, str) else "").encode("ascii", "ignore").decode("ascii").lower()
+    return NON_ALNUM.sub(" ", text).strip()
+
+
+def trigrams(folded: str) -> frozenset:
+    padded = f"  {folded} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2)) if folded else frozenset()
+
+
+def similarity(a: frozenset, b: frozenset) -> float:
+    """Dice coefficient of two trigram sets"""
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+def build_index():
+    """Folded alias -> key, and per-key trigram sets of the aliases fuzzy matching may use"""
+    aliases, grams = {}, []
+    for key, (label, synonyms) in CANONICAL_NICHES.items():
+        for alias in {fold(key), fold(label), *(fold(s) for s in synonyms)}:
+            aliases.setdefault(alias, key)
+            if alias not in GENERIC_ALIASES:
+                grams.append((key, alias, trigrams(alias)))
+    return aliases, grams
+
+NICHE_ALIASES, NICHE_TRIGRAMS = build_index()
+
+
+def content_words(folded: str) -> str:
+    return " ".join(word for word in folded.split() if word not in STOPWORDS)
+
+
+@lru_cache(maxsize=4096)
+def canonical_niche(niche: Optional[str]) -> str:
+    """Canonical key for a free-text niche; unknown niches get their folded text as key"""
+    folded = fold(niche)
+    if not folded:
+        return "outro"
+    if folded in NICHE_ALIASES:
+        return NICHE_ALIASES[folded]
+
+    # Longest alias contained word-for-word wins ("barbearia masculina premium" -> barbearia),
+    # unless the words around it hold a qualifier ("salao de beleza para festas")
+    padded = f" {folded} "
+    contained = [alias for alias in NICHE_ALIASES if alias not in GENERIC_ALIASES and f" {alias} " in padded]
+    leftover = set(folded.split())
+    if contained:
+        alias = max(contained, key=len)
+        leftover -= set(alias.split())
+        if not leftover & BLOCKING_QUALIFIERS:
+            return NICHE_ALIASES[alias]
+
+    words = content_words(folded) or folded
+    if leftover & BLOCKING_QUALIFIERS:
+        return words.replace(" ", "_")
+    query = trigrams(words)
+    best_key, best_score = None, 0.0
+    for key, alias, grams in NICHE_TRIGRAMS:
+        score = similarity(query, grams)
+        if score > best_score:
+            best_key, best_score = key, score
+    if best_score >= NICHE_SIMILARITY_THRESHOLD:
+        return best_key
+    return words.replace(" ", "_")
+
+
+def resolve_niche(niche: Optional[str]) -> Tuple[str, str]:
+    """(canonical key, label for prompts); unknown niches keep the user's wording"""
+    key = canonical_niche(niche)
+    if key in CANONICAL_NICHES:
+        return key, CANONICAL_NICHES[key][0]
+    return key, (niche or "").strip()
+
+
+@lru_cache(maxsize=4096)
+def canonical_city(city: Optional[str]) -> str:
+    """Folded city without state suffix ("São Paulo - SP", "sampa" -> "sao_paulo")"""
+    folded = fold(city)
+    words = folded.split()
+    if len(words) > 1 and words[-1] in STATE_CODES:
+        words = words[:-1]
+    folded = " ".join(words)
+    return CITY_ALIASES.get(folded, folded).replace(" ", "_")
+
+
+def resolve_city(city: Optional[str]) -> Tuple[str, str]:
+    """(canonical key, label for prompts); "sampa" -> ("sao_paulo", "São Paulo"), "maringá - pr" -> ("maringa", "Maringá")"""
+    key = canonical_city(city)
+    if key.replace("_", " ") in CITY_LABELS:
+        return key, CITY_LABELS[key.replace("_", " ")]
+    words = CITY_WORD.findall(city or "")
+    if len(words) > 1 and fold(words[-1]) in STATE_CODES:
+        words = words[:-1]
+    label = " ".join(
+        word.lower() if i and word.lower() in CITY_CONNECTORS else "-".join(part.capitalize() for part in word.split("-"))
+        for i, word in enumerate(words)
+    )
+    return key, label
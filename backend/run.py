@@ -0,0 +1,57 @@
+"""Multi-worker launcher for the Radar de Clientes API.
+
+Run from the backend folder:
+
+    python run.py [--workers N] [--host HOST] [--port PORT]
+
+One worker per CPU available to the process unless WEB_CONCURRENCY or
+--workers says otherwise. Workers share version stamps, caches, counters
+and the leader lease through SHARED_STATE_URL, which is required for more
+than one worker.
+"""
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+
+import uvicorn
+from dotenv import load_dotenv
+
+
+def available_cpus():
+    # Respects taskset/cgroup CPU pinning, unlike os.cpu_count()
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def main():
+    # The workers load it too; here it feeds the defaults and the SHARED_STATE_URL check
+    load_dotenv(Path(__file__).parent / '.env')
+    parser = argparse.ArgumentParser(description="Radar de Clientes API server")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", "0")) or available_cpus())
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.workers > 1 and not os.environ.get("SHARED_STATE_URL"):
+        logging.error("Defina SHARED_STATE_URL (redis://...) para rodar mais de um worker")
+        return 1
+
+    logging.info(f"Iniciando {args.workers} worker(s) em {args.host}:{args.port}")
+    uvicorn.run(
+        "server:create_app",
+        factory=True,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        proxy_headers=True,
+        log_level="warning",
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""Lead scoring for prioritization.
+
+A score (0-100) is the weighted sum of five signals: where the lead came
+from, how well its landing page converts, how recent it is, whether the
+interest text shows buying intent and how complete the contact is.
+score_lead scores one lead on capture; score_frame applies the same rules
+to a whole business with numpy/pandas (imported lazily) for the batch job.
+"""
+import math
+import re
+import unicodedata
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from dedup import normalize_email, normalize_frame, normalize_phone
+
+# Points each signal can contribute; they add up to 100
+SOURCE_WEIGHT = 10
+PAGE_RATE_WEIGHT = 20
+RECENCY_WEIGHT = 30
+INTENT_WEIGHT = 15
+COMPLETENESS_WEIGHT = 25
+
+# Share of SOURCE_WEIGHT per source kind (sources are "manual" or "landing_page:{slug}")
+SOURCE_FACTORS = {"landing_page": 1.0, "manual": 0.5}
+
+# Pages with few visits are pulled towards this rate instead of scoring 0% or 100%
+PAGE_RATE_PRIOR = 0.05
+PAGE_RATE_PRIOR_VISITS = 20
+# Conversion rate that earns the full PAGE_RATE_WEIGHT
+PAGE_RATE_TARGET = 0.2
+
+# The recency signal halves every RECENCY_HALF_LIFE_DAYS
+RECENCY_HALF_LIFE_DAYS = 7
+
+# Accent-free stems that signal buying intent; INTENT_FULL_MATCHES hits earn the full weight
+INTENT_KEYWORDS = (
+    "orcamento", "preco", "valor", "quanto custa", "comprar", "contratar", "agendar",
+    "agendamento", "marcar", "horario", "urgente", "hoje", "amanha", "pacote", "promocao",
+)
+INTENT_FULL_MATCHES = 2
+
+# Completeness points out of COMPLETENESS_WEIGHT
+COMPLETENESS_PARTS = {"phone": 0.5, "email": 0.3, "interest": 0.2}
+
+NON_ALNUM = re.compile(r"[^a-z0-9]+")
+INTENT_PATTERN = re.compile(r"\b(?:" + "|".join(re.escape(k) for k in INTENT_KEYWORDS) + r")")
+
+
+def fold_text(text: Optional[str]) -> str:
+    text = unicodedata.normalize("NFKD", text if isinstance(text, str) else "").encode("ascii", "ignore").decode("ascii").lower()
+    return NON_ALNUM.sub(" ", text).strip()
+
+
+def page_conversion_rates(pages: List[dict]) -> Dict[str, float]:
+    """Smoothed conversion rate per landing page slug"""
+    return {
+        page["slug"]: (page.get("conversions", 0) + PAGE_RATE_PRIOR * PAGE_RATE_PRIOR_VISITS)
+        / (page.get("visits", 0) + PAGE_RATE_PRIOR_VISITS)
+        for page in pages
+    }
+
+
+def source_slug(source: Optional[str]) -> Optional[str]:
+    kind, sep, slug = (source or "").partition(":")
+    return slug if kind == "landing_page" and sep else None
+
+
+def score_lead(lead: dict, page_rates: Dict[str, float], now: Optional[datetime] = None) -> float:
+    """Score of a single lead, 0-100 rounded to one decimal"""
+    now = now or datetime.now(timezone.utc)
+    kind = (lead.get("source") or "").partition(":")[0]
+    score = SOURCE_WEIGHT * SOURCE_FACTORS.get(kind, 0.0)
+
+    slug = source_slug(lead.get("source"))
+    if slug in page_rates:
+        score += PAGE_RATE_WEIGHT * min(page_rates[slug] / PAGE_RATE_TARGET, 1.0)
+
+    created_at = lead.get("created_at")
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+    if created_at:
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        age_days = max((now - created_at).total_seconds(), 0) / 86400
+        score += RECENCY_WEIGHT * math.pow(0.5, age_days / RECENCY_HALF_LIFE_DAYS)
+
+    matches = len(INTENT_PATTERN.findall(fold_text(lead.get("interest"))))
+    score += INTENT_WEIGHT * min(matches / INTENT_FULL_MATCHES, 1.0)
+
+    filled = {
+        "phone": normalize_phone(lead.get("phone")) is not None,
+        "email": normalize_email(lead.get("email")) is not None,
+        "interest": bool(fold_text(lead.get("interest"))),
+    }
+    score += COMPLETENESS_WEIGHT * sum(part for field, part in COMPLETENESS_PARTS.items() if filled[field])
+    return round(score, 1)
+
+
+def score_frame(df, page_rates: Dict[str, float], now: Optional[datetime] = None):
+    """Vectorized score_lead; adds a "score" column to a DataFrame of leads"""
+    import numpy as np
+    import pandas as pd
+
+    now = now or datetime.now(timezone.utc)
+    source = df["source"].fillna("").astype(str)
+    kind = source.str.partition(":")[0]
+    score = SOURCE_WEIGHT * kind.map(SOURCE_FACTORS).fillna(0.0).to_numpy(dtype=float)
+
+    slug = source.where(kind == "landing_page", "").str.partition(":")[2]
+    rate = slug.map(page_rates).fillna(0.0).to_numpy(dtype=float)
+    score += PAGE_RATE_WEIGHT * np.minimum(rate / PAGE_RATE_TARGET, 1.0)
+
+    created_at = pd.to_datetime(df["created_at"], utc=True, format="ISO8601")
+    age_days = ((pd.Timestamp(now) - created_at).dt.total_seconds() / 86400).clip(lower=0)
+    score += RECENCY_WEIGHT * np.power(0.5, age_days.fillna(np.inf).to_numpy() / RECENCY_HALF_LIFE_DAYS)
+
+    # Interest texts repeat a lot (page offers), so each distinct one is folded once
+    interest = df["interest"].astype(object).where(df["interest"].notna(), None)
+    folded = {value: fold_text(value) for value in pd.unique(interest)}
+    interest_folded = pd.Series([folded[value] for value in interest], index=df.index, dtype=object)
+    matches = interest_folded.str.count(INTENT_PATTERN.pattern).to_numpy(dtype=float)
+    score += INTENT_WEIGHT * np.minimum(matches / INTENT_FULL_MATCHES, 1.0)
+
+    df = normalize_frame(df)
+    completeness = (
+        COMPLETENESS_PARTS["phone"] * df["phone_normalized"].notna().to_numpy()
+        + COMPLETENESS_PARTS["email"] * df["email_normalized"].notna().to_numpy()
+        + COMPLETENESS_PARTS["interest"] * (interest_folded != "").to_numpy()
+    )
+    score += COMPLETENESS_WEIGHT * completeness
+    df["score"] = np.round(score, 1)
+    return df
@@ -1,45 +1,122 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Depends, BackgroundTasks
 from fastapi import FastAPI, APIRouter, HTTPException, Depends, Body
+from fastapi import Request, Query
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from supabase import create_client, Client
+from starlette.middleware.gzip import GZipMiddleware
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-import google.generativeai as genai
 import os
+import re
+import time
+import hashlib
+import math
+import socket
+import orjson
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from typing import List, Optional, TYPE_CHECKING
+from contextlib import asynccontextmanager
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qsl
 import uuid
 from datetime import datetime, timezone, timedelta
 
+from dedup import normalize_phone, normalize_email, is_probable_duplicate
+from scoring import score_lead, page_conversion_rates
+from niches import resolve_niche, resolve_city
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # Supabase connection
 SUPABASE_URL = os.environ.get('SUPABASE_URL')
 SUPABASE_KEY = os.environ.get('SUPABASE_KEY')
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+SUPABASE_POOL_SIZE = int(os.environ.get('SUPABASE_POOL_SIZE', '20'))
+SUPABASE_TIMEOUT_SECONDS = float(os.environ.get('SUPABASE_TIMEOUT_SECONDS', '10'))
+
+# Read replicas (optional, comma-separated Supabase URLs)
+SUPABASE_READ_REPLICA_URLS = [url.strip() for url in os.environ.get('SUPABASE_READ_REPLICA_URLS', '').split(',') if url.strip()]
+SUPABASE_READ_REPLICA_KEY = os.environ.get('SUPABASE_READ_REPLICA_KEY', SUPABASE_KEY)
+READ_AFTER_WRITE_WINDOW_SECONDS = float(os.environ.get('READ_AFTER_WRITE_WINDOW_SECONDS', '5'))
+REPLICA_RETRY_SECONDS = float(os.environ.get('REPLICA_RETRY_SECONDS', '30'))
+REPLICA_HEALTH_CHECK_INTERVAL_SECONDS = float(os.environ.get('REPLICA_HEALTH_CHECK_INTERVAL_SECONDS', '15'))
 
 # JWT Config
 JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'radar-clientes-super-secret-key-2025')
 JWT_ALGORITHM = os.environ.get('JWT_ALGORITHM', 'HS256')
 JWT_EXPIRATION_HOURS = int(os.environ.get('JWT_EXPIRATION_HOURS', '24'))
 
-# Google Gemini Config
+# Google Gemini Config (the SDK is imported on first use, see get_genai)
 GOOGLE_GEMINI_API_KEY = os.environ.get('GOOGLE_GEMINI_API_KEY')
-if GOOGLE_GEMINI_API_KEY:
-    genai.configure(api_key=GOOGLE_GEMINI_API_KEY)
+
+# AI insight cache (results are shared by businesses whose niche and city canonicalize alike, see niches.py)
+INSIGHT_CACHE_TTL_SECONDS = float(os.environ.get('INSIGHT_CACHE_TTL_SECONDS', '21600'))
+INSIGHT_CACHE_MAX_ENTRIES = int(os.environ.get('INSIGHT_CACHE_MAX_ENTRIES', '1000'))
+
+# Response compression
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '4'))
+
+# Shared state for multi-worker deployments (SHARED_STATE_URL=redis://...): version stamps,
+# identity/insight caches, page counters and leader election. Without it each worker keeps its own
+SHARED_STATE_URL = os.environ.get('SHARED_STATE_URL')
+IDENTITY_CACHE_TTL_SECONDS = float(os.environ.get('IDENTITY_CACHE_TTL_SECONDS', '60'))
+IDENTITY_CACHE_MAX_ENTRIES = int(os.environ.get('IDENTITY_CACHE_MAX_ENTRIES', '10000'))
+# Redis commands (shared state, realtime, rate limits) give up after SHARED_STATE_TIMEOUT_SECONDS; after a
+# failure the workers run on their own (local caches, no ETags) and try Redis again every SHARED_STATE_RETRY_SECONDS
+SHARED_STATE_TIMEOUT_SECONDS = float(os.environ.get('SHARED_STATE_TIMEOUT_SECONDS', '0.5'))
+SHARED_STATE_RETRY_SECONDS = float(os.environ.get('SHARED_STATE_RETRY_SECONDS', '5'))
+COUNTER_FLUSH_INTERVAL_SECONDS = float(os.environ.get('COUNTER_FLUSH_INTERVAL_SECONDS', '5'))
+LEADER_LEASE_SECONDS = float(os.environ.get('LEADER_LEASE_SECONDS', '15'))
+
+# Realtime (set REALTIME_BROKER_URL=redis://... to fan out across workers; defaults to SHARED_STATE_URL)
+REALTIME_BROKER_URL = os.environ.get('REALTIME_BROKER_URL', SHARED_STATE_URL)
+REALTIME_KEEPALIVE_SECONDS = float(os.environ.get('REALTIME_KEEPALIVE_SECONDS', '15'))
+REALTIME_QUEUE_SIZE = int(os.environ.get('REALTIME_QUEUE_SIZE', '100'))
+# Lifetime of the stream token sent in the EventSource URL (it ends up in access logs)
+REALTIME_TOKEN_TTL_SECONDS = int(os.environ.get('REALTIME_TOKEN_TTL_SECONDS', '60'))
+
+# Public endpoint protection (/api/p/...). Limits are requests per RATE_LIMIT_WINDOW_SECONDS;
+# set RATE_LIMIT_BACKEND_URL=redis://... to share the counters across workers
+RATE_LIMIT_BACKEND_URL = os.environ.get('RATE_LIMIT_BACKEND_URL', SHARED_STATE_URL)
+RATE_LIMIT_WINDOW_SECONDS = float(os.environ.get('RATE_LIMIT_WINDOW_SECONDS', '60'))
+RATE_LIMIT_PER_IP = int(os.environ.get('RATE_LIMIT_PER_IP', '120'))
+RATE_LIMIT_LEADS_PER_IP = int(os.environ.get('RATE_LIMIT_LEADS_PER_IP', '10'))
+RATE_LIMIT_PER_SLUG = int(os.environ.get('RATE_LIMIT_PER_SLUG', '600'))
+RATE_LIMIT_PER_BUSINESS = int(os.environ.get('RATE_LIMIT_PER_BUSINESS', '1200'))
+SLUG_FILTER_REFRESH_SECONDS = float(os.environ.get('SLUG_FILTER_REFRESH_SECONDS', '300'))
+SLUG_FILTER_FALSE_POSITIVE_RATE = float(os.environ.get('SLUG_FILTER_FALSE_POSITIVE_RATE', '0.01'))
+LOAD_SHED_MAX_LAG_MS = float(os.environ.get('LOAD_SHED_MAX_LAG_MS', '250'))
+LOAD_SHED_MAX_IN_FLIGHT = int(os.environ.get('LOAD_SHED_MAX_IN_FLIGHT', '200'))
+LOAD_SHED_PATH_PREFIXES = tuple(p.strip() for p in os.environ.get('LOAD_SHED_PATH_PREFIXES', '/api/p/').split(',') if p.strip())
+LOAD_MONITOR_INTERVAL_SECONDS = 0.1
+
+# Analytics rollups (see migrations/001_analytics_rollups.sql)
+MAX_TIMESERIES_BUCKETS = int(os.environ.get('MAX_TIMESERIES_BUCKETS', '744'))
+
+# Lead deduplication (see dedup.py and migrations/003_lead_dedup.sql)
+LEAD_DEDUP_ON_INSERT = os.environ.get('LEAD_DEDUP_ON_INSERT', 'true').lower() == 'true'
+
+# Composite reads
+MAX_BATCH_REQUESTS = int(os.environ.get('MAX_BATCH_REQUESTS', '10'))
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
-# Create the main app
-app = FastAPI(title="Radar de Clientes API")
-
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
@@ -96,6 +173,7 @@ class LeadResponse(BaseModel):
     interest: Optional[str] = None
     source: str
     status: str
+    score: Optional[float] = None
     created_at: datetime
 
 class CampaignCreate(BaseModel):
@@ -138,11 +216,13 @@ class LandingPageResponse(BaseModel):
 class InsightRequest(BaseModel):
     niche: str
     city: Optional[str] = None
-    type: str = "trends"  # trends, complaints, opportunities
+    type: str = "trends"  # trends, complaints, opportunities, all
+    refresh: bool = False  # skip the insight cache
 
 class StrategyRequest(BaseModel):
     niche: str
     insight_type: str = "campaign"  # campaign, content, promotion
+    refresh: bool = False  # skip the insight cache
 
 class ReportRequest(BaseModel):
     period: str = "weekly"  # daily, weekly, monthly
@@ -151,6 +231,1039 @@ class TokenResponse(BaseModel):
     access_token: str
     token_type: str = "bearer"
 
+class BatchSubRequest(BaseModel):
+    id: str
+    path: str  # e.g. "/leads", relative to /api
+    if_none_match: Optional[str] = None
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest] = Field(..., min_length=1, max_length=MAX_BATCH_REQUESTS)
+
+def model_columns(model) -> str:
+    """PostgREST column list matching a response model's fields"""
+    return ",".join(model.model_fields)
+
+USER_COLUMNS = model_columns(UserResponse)
+LEAD_COLUMNS = model_columns(LeadResponse)
+CAMPAIGN_COLUMNS = model_columns(CampaignResponse)
+LANDING_PAGE_COLUMNS = model_columns(LandingPageResponse)
+
+# ============== DATABASE CLIENTS ==============
+
+class LazySupabaseClient:
+    """Supabase client built on first use, backed by a pooled httpx client."""
+
+    def __init__(self, url: str, key: str):
+        self.url = url
+        self.key = key
+        self._client = None
+
+    @property
+    def client(self) -> "Client":
+        if self._client is None:
+            import httpx
+            from supabase import create_client, ClientOptions
+
+            http_client = httpx.Client(
+                timeout=SUPABASE_TIMEOUT_SECONDS,
+                limits=httpx.Limits(max_connections=SUPABASE_POOL_SIZE, max_keepalive_connections=SUPABASE_POOL_SIZE),
+            )
+            self._client = create_client(self.url, self.key, ClientOptions(httpx_client=http_client))
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def warm_up(self):
+        """Open a pooled connection ahead of the first request"""
+        self.client.table("landing_pages").select("id").limit(1).execute()
+
+    def close(self):
+        if self._client is not None:
+            self._client.postgrest.aclose()  # closes the sync session despite the name
+            self._client = None
+
+supabase = LazySupabaseClient(SUPABASE_URL, SUPABASE_KEY)
+
+# ============== READ ROUTING ==============
+
+class ReadReplicaRouter:
+    """Send reads to healthy replicas; keep recent writers on the primary."""
+
+    def __init__(self, primary: LazySupabaseClient, replica_urls: List[str], replica_key: str,
+                 sticky_seconds: float, retry_seconds: float):
+        self.primary = primary
+        self.replicas = [(url, LazySupabaseClient(url, replica_key)) for url in replica_urls]
+        self.sticky_seconds = sticky_seconds
+        self.retry_seconds = retry_seconds
+        self._down_until = {}
+        self._last_write = {}
+        self._next = 0
+
+    def mark_write(self, key: str):
+        now = time.monotonic()
+        self._last_write[key] = now
+        if len(self._last_write) > 10000:
+            cutoff = now - self.sticky_seconds
+            self._last_write = {k: t for k, t in self._last_write.items() if t >= cutoff}
+
+    def is_sticky(self, key: Optional[str]) -> bool:
+        if key is None:
+            return False
+        last_write = self._last_write.get(key)
+        return last_write is not None and time.monotonic() - last_write < self.sticky_seconds
+
+    def mark_down(self, url: str):
+        self._down_until[url] = time.monotonic() + self.retry_seconds
+
+    def _pick_replica(self):
+        now = time.monotonic()
+        healthy = [r for r in self.replicas if self._down_until.get(r[0], 0) <= now]
+        if not healthy:
+            return None
+        self._next = (self._next + 1) % len(healthy)
+        return healthy[self._next]
+
+    def read(self, build, sticky_key: Optional[str] = None, fallback_on_empty: bool = False):
+        """Run the query built by `build(client)` on a replica, falling back to the primary."""
+        replica = None if self.is_sticky(sticky_key) else self._pick_replica()
+        if replica is None:
+            return build(self.primary).execute()
+
+        url, client = replica
+        try:
+            result = build(client).execute()
+        except Exception as e:
+            logging.warning(f"Réplica {url} indisponível, usando primário: {e}")
+            self.mark_down(url)
+            return build(self.primary).execute()
+
+        # Rows created moments ago may not have replicated yet
+        if fallback_on_empty and not result.data:
+            return build(self.primary).execute()
+        return result
+
+    def read_all(self, build, sticky_key: Optional[str] = None, page_size: int = 1000) -> list:
+        """Like read(), but pages through every row (`build` must order by a unique key)"""
+        rows = []
+        while True:
+            offset = len(rows)
+            page = self.read(lambda db: build(db).range(offset, offset + page_size - 1), sticky_key=sticky_key).data or []
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+
+    def check_replicas(self):
+        for url, client in self.replicas:
+            try:
+                client.warm_up()
+                self._down_until.pop(url, None)
+            except Exception as e:
+                logging.warning(f"Health check da réplica {url} falhou: {e}")
+                self.mark_down(url)
+
+    def close(self):
+        for _, client in self.replicas:
+            client.close()
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        return {url: ("down" if self._down_until.get(url, 0) > now else "up") for url, _ in self.replicas}
+
+db_router = ReadReplicaRouter(
+    supabase,
+    SUPABASE_READ_REPLICA_URLS,
+    SUPABASE_READ_REPLICA_KEY,
+    READ_AFTER_WRITE_WINDOW_SECONDS,
+    REPLICA_RETRY_SECONDS,
+)
+
+# ============== SHARED STATE ==============
+
+class SharedStateUnavailable(Exception):
+    """The shared state could not be reached; callers degrade to per-worker behavior."""
+
+def redis_client(url: str, read_timeout: bool = True):
+    """Redis client whose commands give up after SHARED_STATE_TIMEOUT_SECONDS.
+
+    Pub/sub connections stay idle for long stretches, so they only time out
+    while connecting (read_timeout=False).
+    """
+    import redis.asyncio as redis
+    return redis.from_url(
+        url,
+        socket_timeout=SHARED_STATE_TIMEOUT_SECONDS if read_timeout else None,
+        socket_connect_timeout=SHARED_STATE_TIMEOUT_SECONDS,
+    )
+
+class RedisRetryGate:
+    """Skips Redis for SHARED_STATE_RETRY_SECONDS after a failure, logging once per outage."""
+
+    def __init__(self, name: str, fallback: str):
+        self.name = name
+        self.fallback = fallback
+        self._retry_at = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._retry_at is None or time.monotonic() >= self._retry_at
+
+    def failed(self, error: Exception):
+        if self._retry_at is None:
+            logging.warning(f"{self.name} indisponível, {self.fallback}: {error}")
+        self._retry_at = time.monotonic() + SHARED_STATE_RETRY_SECONDS
+
+    def succeeded(self):
+        if self._retry_at is not None:
+            logging.info(f"{self.name} disponível novamente")
+            self._retry_at = None
+
+class LocalStateBackend:
+    """In-process stand-in for the shared state (single worker, tests).
+
+    Same interface as RedisStateBackend: expiring values, integer hashes,
+    leases and a coordination channel whose messages reach every worker.
+    """
+
+    is_shared = False
+
+    def __init__(self):
+        self._values = {}
+        self._hashes = {}
+        self._leases = {}
+        self._handlers = []
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._values[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        self._values[key] = (time.monotonic() + ttl if ttl else None, value)
+
+    async def delete(self, key: str):
+        self._values.pop(key, None)
+
+    async def hsetnx(self, key: str, field: str, value: int) -> int:
+        """Set a hash field unless it exists; returns the stored value"""
+        return self._hashes.setdefault(key, {}).setdefault(field, value)
+
+    async def hincrby(self, key: str, field: str, amount: int = 1) -> int:
+        fields = self._hashes.setdefault(key, {})
+        fields[field] = fields.get(field, 0) + amount
+        return fields[field]
+
+    async def hmget(self, key: str, fields) -> List[int]:
+        values = self._hashes.get(key, {})
+        return [values.get(field, 0) for field in fields]
+
+    async def drain_hash(self, key: str) -> dict:
+        """Read and clear a hash in one step"""
+        return self._hashes.pop(key, {})
+
+    async def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Take or renew a lease; True while owner holds it"""
+        holder, expires_at = self._leases.get(name, (None, 0.0))
+        if holder == owner or expires_at <= time.monotonic():
+            self._leases[name] = (owner, time.monotonic() + ttl)
+            return True
+        return False
+
+    async def release_lease(self, name: str, owner: str):
+        if self._leases.get(name, (None,))[0] == owner:
+            del self._leases[name]
+
+    def subscribe(self, handler):
+        self._handlers.append(handler)
+
+    def dispatch(self, message: dict):
+        for handler in self._handlers:
+            try:
+                handler(message)
+            except Exception as e:
+                logging.error(f"Erro ao processar mensagem de coordenação: {e}")
+
+    async def publish(self, message: dict):
+        self.dispatch(message)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+class RedisStateBackend(LocalStateBackend):
+    """Shared state in Redis; coordination messages go over pub/sub."""
+
+    is_shared = True
+    CHANNEL = "radar:coordination"
+    # Renew when owned, take when free
+    LEASE_SCRIPT = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then
+            return redis.call('pexpire', KEYS[1], ARGV[2])
+        end
+        if redis.call('set', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+            return 1
+        end
+        return 0
+    """
+    RELEASE_SCRIPT = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then
+            return redis.call('del', KEYS[1])
+        end
+        return 0
+    """
+    DRAIN_SCRIPT = """
+        local values = redis.call('hgetall', KEYS[1])
+        redis.call('del', KEYS[1])
+        return values
+    """
+    HSETNX_SCRIPT = """
+        redis.call('hsetnx', KEYS[1], ARGV[1], ARGV[2])
+        return redis.call('hget', KEYS[1], ARGV[1])
+    """
+    RECONNECT_MIN_SECONDS = 1
+    RECONNECT_MAX_SECONDS = 30
+
+    def __init__(self, url: str):
+        super().__init__()
+        self.url = url
+        self._redis = None
+        self._subscriber = None
+        self._pubsub = None
+        self._listener = None
+        self.gate = RedisRetryGate("Estado compartilhado", "workers seguem sem ele")
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = redis_client(self.url)
+        return self._redis
+
+    @property
+    def subscriber(self):
+        if self._subscriber is None:
+            self._subscriber = redis_client(self.url, read_timeout=False)
+        return self._subscriber
+
+    async def _call(self, command: str, *args, **kwargs):
+        """Run a Redis command; SharedStateUnavailable on failure and until the next retry"""
+        if not self.gate.is_open:
+            raise SharedStateUnavailable("Redis indisponível")
+        try:
+            result = await getattr(self.redis, command)(*args, **kwargs)
+        except Exception as e:
+            self.gate.failed(e)
+            raise SharedStateUnavailable(str(e)) from e
+        self.gate.succeeded()
+        return result
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._call("get", key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        await self._call("set", key, value, px=int(ttl * 1000) if ttl else None)
+
+    async def delete(self, key: str):
+        await self._call("delete", key)
+
+    async def hsetnx(self, key: str, field: str, value: int) -> int:
+        return int(await self._call("eval", self.HSETNX_SCRIPT, 1, key, field, value))
+
+    async def hincrby(self, key: str, field: str, amount: int = 1) -> int:
+        return await self._call("hincrby", key, field, amount)
+
+    async def hmget(self, key: str, fields) -> List[int]:
+        return [int(value or 0) for value in await self._call("hmget", key, list(fields))]
+
+    async def drain_hash(self, key: str) -> dict:
+        values = await self._call("eval", self.DRAIN_SCRIPT, 1, key)
+        return {values[i].decode(): int(values[i + 1]) for i in range(0, len(values), 2)}
+
+    async def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        return bool(await self._call("eval", self.LEASE_SCRIPT, 1, name, owner, int(ttl * 1000)))
+
+    async def release_lease(self, name: str, owner: str):
+        await self._call("eval", self.RELEASE_SCRIPT, 1, name, owner)
+
+    async def publish(self, message: dict):
+        # Reaches this worker too, through its own listener
+        await self._call("publish", self.CHANNEL, orjson.dumps(message))
+
+    async def start(self):
+        # Subscribes in the background, so the API also starts while Redis is down
+        self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        delay = self.RECONNECT_MIN_SECONDS
+        while True:
+            try:
+                if self._pubsub is None:
+                    self._pubsub = self.subscriber.pubsub()
+                    await self._pubsub.subscribe(self.CHANNEL)
+                    delay = self.RECONNECT_MIN_SECONDS
+                    # Messages sent while unsubscribed are lost
+                    self.dispatch({"type": "resync"})
+                async for message in self._pubsub.listen():
+                    if message["type"] == "message":
+                        self.dispatch(orjson.loads(message["data"]))
+            except Exception as e:
+                logging.warning(f"Canal de coordenação do Redis perdido, nova tentativa em {delay}s: {e}")
+                pubsub, self._pubsub = self._pubsub, None
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.RECONNECT_MAX_SECONDS)
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        if self._subscriber is not None:
+            await self._subscriber.aclose()
+        if self._redis is not None:
+            await self._redis.aclose()
+        # Jobs bump stamps from several event loops; the next call connects again
+        self._redis = self._subscriber = self._pubsub = self._listener = None
+
+shared_state = RedisStateBackend(SHARED_STATE_URL) if SHARED_STATE_URL else LocalStateBackend()
+
+# ============== VERSION STAMPS ==============
+
+class VersionStamps:
+    """Per-business write counters that back the ETags of read endpoints.
+
+    The counters live in the shared state, so all workers issue and accept
+    the same ETags. Each business hash also holds its epoch: when the hash
+    starts over (Redis restart or eviction, each restart when local) a new
+    epoch is drawn, so ETags issued before never match.
+    """
+
+    KEY_PREFIX = "radar:versions:"
+    EPOCH_FIELD = "epoch"
+
+    def __init__(self):
+        # business_id -> scopes whose bump did not reach the shared state
+        self.pending = {}
+
+    async def bump(self, business_id: str, *scopes: str):
+        for scope in scopes:
+            try:
+                await shared_state.hincrby(f"{self.KEY_PREFIX}{business_id}", scope)
+            except SharedStateUnavailable:
+                self.pending.setdefault(business_id, set()).add(scope)
+
+    async def replay(self) -> bool:
+        """Apply the missed bumps; False while some are still pending"""
+        try:
+            while self.pending:
+                business_id, scopes = next(iter(self.pending.items()))
+                for scope in scopes:
+                    await shared_state.hincrby(f"{self.KEY_PREFIX}{business_id}", scope)
+                del self.pending[business_id]
+        except SharedStateUnavailable:
+            return False
+        return True
+
+    async def etag(self, business_id: str, *scopes: str) -> Optional[str]:
+        """None while the shared state is unreachable; the response then goes without ETag"""
+        key = f"{self.KEY_PREFIX}{business_id}"
+        if not await self.replay():
+            return None
+        try:
+            epoch, *versions = await shared_state.hmget(key, (self.EPOCH_FIELD, *scopes))
+            if not epoch:
+                epoch = await shared_state.hsetnx(key, self.EPOCH_FIELD, uuid.uuid4().int % 2**32 or 1)
+        except SharedStateUnavailable:
+            return None
+        return f'W/"{epoch:x}-{".".join(str(version) for version in versions)}"'
+
+version_stamps = VersionStamps()
+
+async def record_write(business_id: str, *scopes: str):
+    """Pin the business to the primary and invalidate ETags of the written scopes"""
+    db_router.mark_write(business_id)
+    await version_stamps.bump(business_id, *scopes)
+    if db_router.replicas and shared_state.is_shared:
+        # The other workers must read this business from the primary for a while too
+        try:
+            await shared_state.publish({"type": "write", "business_id": business_id})
+        except SharedStateUnavailable:
+            pass
+
+# ============== CACHES ==============
+
+class TTLCache:
+    """In-process LRU cache whose entries expire ttl seconds after being set."""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+class SharedCache:
+    """TTLCache per worker in front of the shared state.
+
+    Keys are strings and values JSON-serializable. invalidate() drops a key
+    from the shared state and, over the coordination channel, from the local
+    copy of every worker.
+    """
+
+    KEY_PREFIX = "radar:cache:"
+    registry = {}
+
+    def __init__(self, namespace: str, ttl: float, max_entries: int):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local = TTLCache(ttl, max_entries)
+        SharedCache.registry[namespace] = self
+
+    def shared_key(self, key: str) -> str:
+        return f"{self.KEY_PREFIX}{self.namespace}:{key}"
+
+    # Without the shared state each worker keeps using its local copy
+    async def get(self, key: str):
+        value = self.local.get(key)
+        if value is None and shared_state.is_shared:
+            try:
+                raw = await shared_state.get(self.shared_key(key))
+            except SharedStateUnavailable:
+                return None
+            if raw is not None:
+                value = orjson.loads(raw)
+                self.local.set(key, value)
+        return value
+
+    async def set(self, key: str, value):
+        self.local.set(key, value)
+        if shared_state.is_shared:
+            try:
+                await shared_state.set(self.shared_key(key), orjson.dumps(value), self.ttl)
+            except SharedStateUnavailable:
+                pass
+
+    async def invalidate(self, key: str):
+        self.local.delete(key)
+        if shared_state.is_shared:
+            try:
+                await shared_state.delete(self.shared_key(key))
+                await shared_state.publish({"type": "invalidate", "cache": self.namespace, "key": key})
+            except SharedStateUnavailable:
+                # Other workers drop their copies when the coordination channel resyncs
+                pass
+
+insight_cache = SharedCache("insight", INSIGHT_CACHE_TTL_SECONDS, INSIGHT_CACHE_MAX_ENTRIES)
+# Users by id and businesses by user id: two primary queries saved on every authenticated request
+user_cache = SharedCache("user", IDENTITY_CACHE_TTL_SECONDS, IDENTITY_CACHE_MAX_ENTRIES)
+business_cache = SharedCache("business", IDENTITY_CACHE_TTL_SECONDS, IDENTITY_CACHE_MAX_ENTRIES)
+
+def handle_coordination_message(message: dict):
+    if message["type"] == "invalidate" and message["cache"] in SharedCache.registry:
+        SharedCache.registry[message["cache"]].local.delete(message["key"])
+    elif message["type"] == "write":
+        db_router.mark_write(message["business_id"])
+    elif message["type"] == "resync":
+        # Invalidations may have been missed while the channel was down
+        for cache in SharedCache.registry.values():
+            cache.local.clear()
+
+shared_state.subscribe(handle_coordination_message)
+
+# ============== COUNTERS ==============
+
+class PageCounters:
+    """Landing page visits/conversions buffered in the shared state.
+
+    Public pages only increment the buffer; the leader flushes it to the
+    database in one RPC per interval (see migrations/006_page_counters.sql),
+    so concurrent workers never overwrite each other's counts.
+    """
+
+    KEY = "radar:counters:landing_pages"
+
+    def __init__(self):
+        # Counts this worker could not add to the shared buffer yet
+        self.unsent = {}
+
+    async def add(self, page_id: str, visits: int = 0, conversions: int = 0):
+        if visits:
+            await self.increment(f"{page_id}:visits", visits)
+        if conversions:
+            await self.increment(f"{page_id}:conversions", conversions)
+
+    async def increment(self, field: str, amount: int):
+        try:
+            await shared_state.hincrby(self.KEY, field, amount)
+        except SharedStateUnavailable:
+            self.unsent[field] = self.unsent.get(field, 0) + amount
+
+    async def resend(self):
+        """Move the counts kept during an outage to the shared buffer"""
+        unsent, self.unsent = self.unsent, {}
+        for field, amount in unsent.items():
+            await self.increment(field, amount)
+
+    async def flush(self) -> int:
+        """Write the buffered counts; returns the number of pages updated"""
+        try:
+            pending = await shared_state.drain_hash(self.KEY)
+        except SharedStateUnavailable:
+            return 0
+        if not pending:
+            return 0
+        counters = {}
+        for field, amount in pending.items():
+            page_id, _, column = field.rpartition(":")
+            counters.setdefault(page_id, {"id": page_id, "visits": 0, "conversions": 0})[column] += amount
+        try:
+            result = await asyncio.to_thread(
+                lambda: supabase.rpc("increment_page_counters", {"p_counters": list(counters.values())}).execute()
+            )
+        except Exception as e:
+            logging.error(f"Falha ao gravar contadores das páginas, nova tentativa no próximo ciclo: {e}")
+            for field, amount in pending.items():
+                await self.increment(field, amount)
+            return 0
+        for business_id in {row["business_id"] for row in result.data or []}:
+            await version_stamps.bump(business_id, "landing_pages")
+        return len(counters)
+
+page_counters = PageCounters()
+
+class LeaderElection:
+    """Lease in the shared state; its holder runs the once-per-deployment jobs."""
+
+    LEASE = "radar:leader"
+
+    def __init__(self):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.is_leader = False
+
+    async def run(self):
+        while True:
+            try:
+                leader = await shared_state.acquire_lease(self.LEASE, self.owner, LEADER_LEASE_SECONDS)
+            except SharedStateUnavailable:
+                # Already logged once for the outage
+                leader = False
+            except Exception as e:
+                logging.warning(f"Falha ao renovar a liderança: {e}")
+                leader = False
+            if leader != self.is_leader:
+                logging.info(f"Worker {self.owner} {'assumiu' if leader else 'perdeu'} a liderança")
+            self.is_leader = leader
+            await asyncio.sleep(LEADER_LEASE_SECONDS / 3)
+
+    async def resign(self):
+        if self.is_leader:
+            self.is_leader = False
+            try:
+                await shared_state.release_lease(self.LEASE, self.owner)
+            except SharedStateUnavailable:
+                # The lease expires on its own
+                pass
+
+leader = LeaderElection()
+
+async def counter_flush_loop():
+    while True:
+        await asyncio.sleep(COUNTER_FLUSH_INTERVAL_SECONDS)
+        await page_counters.resend()
+        await version_stamps.replay()
+        if leader.is_leader:
+            await page_counters.flush()
+
+# ============== REALTIME ==============
+
+class InProcessBroker:
+    """Fans business events out to the stream subscribers of this process."""
+
+    def __init__(self):
+        self._subscribers = {}
+
+    def subscribe(self, business_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=REALTIME_QUEUE_SIZE)
+        self._subscribers.setdefault(business_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, business_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(business_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[business_id]
+
+    def deliver(self, business_id: str, event: dict):
+        # Every worker sees every event, which keeps each worker's slug filter current
+        if event.get("type") == "page.created":
+            slug_filter.add(event["page"]["slug"])
+        for queue in self._subscribers.get(business_id, ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A slow client missed deltas; tell it to reload instead
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+
+    def resync_all(self):
+        """Ask every subscriber to reload, after events may have been missed"""
+        for queues in self._subscribers.values():
+            for queue in queues:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+
+    async def publish(self, business_id: str, event: dict):
+        self.deliver(business_id, event)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+class RedisBroker(InProcessBroker):
+    """Relays events through Redis pub/sub so subscribers on every worker get them."""
+
+    CHANNEL_PREFIX = "radar:realtime:"
+
+    def __init__(self, url: str):
+        super().__init__()
+        self.url = url
+        self._redis = None
+        self._subscriber = None
+        self._pubsub = None
+        self._listener = None
+        self.gate = RedisRetryGate("Tempo real via Redis", "eventos entregues só neste worker")
+
+    RECONNECT_MIN_SECONDS = 1
+    RECONNECT_MAX_SECONDS = 30
+
+    async def start(self):
+        # Subscribes in the background, so the API also starts while Redis is down
+        self._redis = redis_client(self.url)
+        self._subscriber = redis_client(self.url, read_timeout=False)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        delay = self.RECONNECT_MIN_SECONDS
+        reconnecting = False
+        while True:
+            try:
+                if self._pubsub is None:
+                    self._pubsub = self._subscriber.pubsub()
+                    await self._pubsub.psubscribe(f"{self.CHANNEL_PREFIX}*")
+                    delay = self.RECONNECT_MIN_SECONDS
+                    if reconnecting:
+                        logging.info("Tempo real reconectado ao Redis")
+                        self.resync_all()
+                        slug_filter.resume()
+                        reconnecting = False
+                async for message in self._pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    business_id = message["channel"].decode().removeprefix(self.CHANNEL_PREFIX)
+                    self.deliver(business_id, orjson.loads(message["data"]))
+            except Exception as e:
+                # Without resubscribing, this worker's streams and slug filter would stop hearing events
+                logging.warning(f"Conexão do tempo real com o Redis perdida, nova tentativa em {delay}s: {e}")
+                reconnecting = True
+                slug_filter.suspend()
+                pubsub, self._pubsub = self._pubsub, None
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.RECONNECT_MAX_SECONDS)
+
+    async def publish(self, business_id: str, event: dict):
+        if self.gate.is_open:
+            try:
+                await self._redis.publish(f"{self.CHANNEL_PREFIX}{business_id}", orjson.dumps(event))
+                self.gate.succeeded()
+                return
+            except Exception as e:
+                self.gate.failed(e)
+        self.deliver(business_id, event)
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        for client in (self._subscriber, self._redis):
+            if client is not None:
+                await client.aclose()
+
+realtime = RedisBroker(REALTIME_BROKER_URL) if REALTIME_BROKER_URL else InProcessBroker()
+
+async def replica_health_loop():
+    while True:
+        await asyncio.sleep(REPLICA_HEALTH_CHECK_INTERVAL_SECONDS)
+        await asyncio.to_thread(db_router.check_replicas)
+
+# ============== PUBLIC ENDPOINT PROTECTION ==============
+
+class SlidingWindowLimiter:
+    """Per-key request counts over a sliding window, kept in this process.
+
+    The window is approximated from two fixed buckets: the previous bucket's
+    count weighted by how much of it still overlaps the window, plus the
+    current bucket's count.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self._counts = {}
+        self._bucket = 0
+
+    def _position(self):
+        now = time.time()
+        return int(now // self.window), (now % self.window) / self.window
+
+    async def hit(self, key: str, limit: int) -> bool:
+        """Count a request for key; False once the key is over its limit"""
+        bucket, elapsed = self._position()
+        if bucket != self._bucket:
+            self._counts = {k: v for k, v in self._counts.items() if k[1] >= bucket - 1}
+            self._bucket = bucket
+        previous = self._counts.get((key, bucket - 1), 0)
+        current = self._counts.get((key, bucket), 0)
+        if previous * (1 - elapsed) + current >= limit:
+            return False
+        self._counts[(key, bucket)] = current + 1
+        return True
+
+    async def close(self):
+        pass
+
+class RedisRateLimiter(SlidingWindowLimiter):
+    """Same sliding window, with the bucket counters in Redis shared by every worker."""
+
+    KEY_PREFIX = "radar:ratelimit:"
+
+    def __init__(self, url: str, window: float):
+        super().__init__(window)
+        self.url = url
+        self._redis = None
+        self.gate = RedisRetryGate("Rate limit compartilhado", "usando contagem local")
+
+    async def hit(self, key: str, limit: int) -> bool:
+        if not self.gate.is_open:
+            return await super().hit(key, limit)
+        bucket, elapsed = self._position()
+        try:
+            if self._redis is None:
+                self._redis = redis_client(self.url)
+            pipe = self._redis.pipeline(transaction=False)
+            pipe.incr(f"{self.KEY_PREFIX}{key}:{bucket}")
+            pipe.expire(f"{self.KEY_PREFIX}{key}:{bucket}", math.ceil(self.window * 2))
+            pipe.get(f"{self.KEY_PREFIX}{key}:{bucket - 1}")
+            current, _, previous = await pipe.execute()
+        except Exception as e:
+            self.gate.failed(e)
+            return await super().hit(key, limit)
+        self.gate.succeeded()
+        # The INCR above already counted this request
+        return int(previous or 0) * (1 - elapsed) + current <= limit
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.aclose()
+
+rate_limiter = RedisRateLimiter(RATE_LIMIT_BACKEND_URL, RATE_LIMIT_WINDOW_SECONDS) if RATE_LIMIT_BACKEND_URL else SlidingWindowLimiter(RATE_LIMIT_WINDOW_SECONDS)
+
+async def enforce_rate_limits(*limits):
+    """Raise 429 when any (key, limit) pair is over its limit"""
+    for key, limit in limits:
+        if not await rate_limiter.hit(key, limit):
+            raise HTTPException(
+                status_code=429,
+                detail="Muitas requisições. Tente novamente em instantes.",
+                headers={"Retry-After": str(math.ceil(RATE_LIMIT_WINDOW_SECONDS))},
+            )
+
+def client_ip(request: Request) -> str:
+    # Behind a proxy, run uvicorn with --proxy-headers so this is the real client
+    return request.client.host if request.client else "unknown"
+
+# Slugs are created as "{business_id[:8]}-{uuid[:8]}"
+SLUG_PATTERN = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{8}$")
+
+class SlugFilter:
+    """Bloom filter of existing landing page slugs, so scans for unknown slugs skip the DB.
+
+    False positives only cost the DB lookup that would have happened anyway.
+    Until the first load finishes every slug is treated as possibly present.
+    """
+
+    def __init__(self, false_positive_rate: float):
+        self.false_positive_rate = false_positive_rate
+        self.ready = False
+        self.suspended = False
+        self.reload_requested = None
+        self._size, self._hashes, self._bits = 8, 1, bytearray(1)
+        self._added_while_loading = set()
+        self._generation = 0
+        self._loading_generation = 0
+
+    @staticmethod
+    def _positions(slug: str, size: int, hashes: int):
+        digest = hashlib.blake2b(slug.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big") | 1
+        return ((first + i * second) % size for i in range(hashes))
+
+    def add(self, slug: str):
+        self._added_while_loading.add(slug)
+        for position in self._positions(slug, self._size, self._hashes):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def might_contain(self, slug: str) -> bool:
+        if not self.ready:
+            return True
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(slug, self._size, self._hashes))
+
+    def build(self, slugs: List[str]) -> tuple:
+        """New (size, hashes, bits) for slugs; CPU-bound, safe to run in a thread"""
+        # Sized for twice the current pages so new ones don't degrade it before the next load
+        capacity = max(len(slugs) * 2, 1024)
+        size = math.ceil(-capacity * math.log(self.false_positive_rate) / math.log(2) ** 2)
+        hashes = max(1, round(size / capacity * math.log(2)))
+        bits = bytearray(size // 8 + 1)
+        for slug in slugs:
+            for position in self._positions(slug, size, hashes):
+                bits[position >> 3] |= 1 << (position & 7)
+        return size, hashes, bits
+
+    def suspend(self):
+        """Let every slug through while page.created events may be missed (broker down)"""
+        self.suspended = True
+        self.ready = False
+
+    def resume(self):
+        # Loads started before this point may lack pages created while suspended
+        self.suspended = False
+        self._generation += 1
+        if self.reload_requested is not None:
+            self.reload_requested.set()
+
+    def begin_load(self):
+        self._added_while_loading = set()
+        self._loading_generation = self._generation
+
+    def install(self, built: tuple):
+        # Runs on the event loop, like add(), so no slug created during the load is lost
+        self._size, self._hashes, self._bits = built
+        for slug in self._added_while_loading:
+            self.add(slug)
+        self._added_while_loading = set()
+        self.ready = not self.suspended and self._loading_generation == self._generation
+
+slug_filter = SlugFilter(SLUG_FILTER_FALSE_POSITIVE_RATE)
+
+def build_slug_filter() -> tuple:
+    rows = db_router.read_all(lambda db: db.table("landing_pages").select("id,slug").order("id"))
+    return slug_filter.build([row["slug"] for row in rows])
+
+async def slug_filter_loop():
+    # Bound to the running loop (a new one per lifespan under tests)
+    slug_filter.reload_requested = asyncio.Event()
+    while True:
+        slug_filter.reload_requested.clear()
+        try:
+            slug_filter.begin_load()
+            slug_filter.install(await asyncio.to_thread(build_slug_filter))
+        except Exception as e:
+            logging.warning(f"Não foi possível carregar o filtro de slugs: {e}")
+        try:
+            await asyncio.wait_for(slug_filter.reload_requested.wait(), SLUG_FILTER_REFRESH_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+class LoadMonitor:
+    """Event-loop lag and in-flight request count used to shed load."""
+
+    def __init__(self):
+        self.lag_ms = 0.0
+        self.in_flight = 0
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LOAD_MONITOR_INTERVAL_SECONDS)
+            self.lag_ms = max(0.0, (loop.time() - start - LOAD_MONITOR_INTERVAL_SECONDS) * 1000)
+
+    def overloaded(self) -> bool:
+        return self.lag_ms > LOAD_SHED_MAX_LAG_MS or self.in_flight > LOAD_SHED_MAX_IN_FLIGHT
+
+    def status(self) -> dict:
+        return {"lag_ms": round(self.lag_ms, 1), "in_flight": self.in_flight}
+
+load_monitor = LoadMonitor()
+
+class LoadShedMiddleware:
+    """Answers 503 on LOAD_SHED_PATH_PREFIXES while the worker is overloaded."""
+
+    # Long-lived streams would otherwise count as in flight for their whole life
+    UNTRACKED_PATHS = {"/api/realtime/stream"}
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.UNTRACKED_PATHS:
+            await self.app(scope, receive, send)
+            return
+        if scope["path"].startswith(LOAD_SHED_PATH_PREFIXES) and load_monitor.overloaded():
+            response = ORJSONResponse(
+                {"detail": "Servidor sobrecarregado. Tente novamente em instantes."},
+                status_code=503,
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+        load_monitor.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            load_monitor.in_flight -= 1
+
 # ============== HELPER FUNCTIONS ==============
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -165,6 +1278,42 @@ def create_access_token(data: dict) -> str:
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
 
+def create_stream_token(user_id: str) -> str:
+    """Short-lived token that only opens /realtime/stream"""
+    expire = datetime.now(timezone.utc) + timedelta(seconds=REALTIME_TOKEN_TTL_SECONDS)
+    return jwt.encode({"sub": user_id, "scope": "realtime", "exp": expire}, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
+
+def cache_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Authorization"}
+
+def etag_in(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison: ignore the W/ prefix on both sides
+    return "*" in candidates or etag.removeprefix("W/") in [tag.removeprefix("W/") for tag in candidates]
+
+def etag_matches(request: Request, etag: Optional[str]) -> bool:
+    return etag is not None and etag_in(request.headers.get("if-none-match"), etag)
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag))
+
+def json_response(request: Request, content, etag: Optional[str] = None) -> Response:
+    """Serialize trusted DB rows with orjson, skipping per-row model validation.
+
+    Bodies over COMPRESSION_MIN_SIZE are brotli-compressed when the client
+    accepts it; otherwise GZipMiddleware takes care of them.
+    """
+    response = ORJSONResponse(content, headers=cache_headers(etag) if etag else None)
+    accepts_br = "br" in request.headers.get("accept-encoding", "")
+    if brotli is not None and accepts_br and len(response.body) >= COMPRESSION_MIN_SIZE:
+        response.body = brotli.compress(response.body, quality=BROTLI_QUALITY)
+        response.headers["content-encoding"] = "br"
+        response.headers["content-length"] = str(len(response.body))
+        response.headers.add_vary_header("Accept-Encoding")
+    return response
+
 def parse_datetime(dt_value):
     """Parse datetime from string or return as is"""
     if isinstance(dt_value, str):
@@ -172,43 +1321,74 @@ def parse_datetime(dt_value):
     return dt_value
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    token = credentials.credentials
+    return await user_from_token(credentials.credentials)
+
+async def user_from_token(token: str, scope: Optional[str] = None) -> dict:
+    """User of a token; scoped tokens (e.g. stream tokens) only work where that scope is asked for"""
     try:
         payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
         user_id: str = payload.get("sub")
-        if user_id is None:
+        if user_id is None or payload.get("scope") != scope:
             raise HTTPException(status_code=401, detail="Token inválido")
     except JWTError:
         raise HTTPException(status_code=401, detail="Token inválido ou expirado")
     
-    result = supabase.table("users").select("*").eq("id", user_id).execute()
-    if not result.data:
-        raise HTTPException(status_code=401, detail="Usuário não encontrado")
-    return result.data[0]
+    user = await user_cache.get(user_id)
+    if user is None:
+        # Only the public columns, so the password hash never reaches the cache
+        result = supabase.table("users").select(USER_COLUMNS).eq("id", user_id).execute()
+        if not result.data:
+            raise HTTPException(status_code=401, detail="Usuário não encontrado")
+        user = result.data[0]
+        await user_cache.set(user_id, user)
+    return user
 
 async def get_user_business(user: dict):
-    result = supabase.table("businesses").select("*").eq("user_id", user["id"]).execute()
-    if not result.data:
-        raise HTTPException(status_code=404, detail="Negócio não encontrado. Configure seu negócio primeiro.")
-    return result.data[0]
-
-async def generate_ai_content(prompt: str, system_message: str = None) -> str:
+    business = await business_cache.get(user["id"])
+    if business is None:
+        result = supabase.table("businesses").select("*").eq("user_id", user["id"]).execute()
+        if not result.data:
+            raise HTTPException(status_code=404, detail="Negócio não encontrado. Configure seu negócio primeiro.")
+        business = result.data[0]
+        await business_cache.set(user["id"], business)
+    return business
+
+_genai = None
+
+def get_genai():
+    """Import and configure the Gemini SDK on first use"""
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        genai.configure(api_key=GOOGLE_GEMINI_API_KEY)
+        _genai = genai
+    return _genai
+
+AI_NOT_CONFIGURED_MESSAGE = "Chave de API do Gemini não configurada."
+AI_ERROR_PREFIX = "Erro ao processar:"
+
+async def generate_ai_content(prompt: str, system_message: str = None, response_schema: Optional[dict] = None) -> str:
     if not GOOGLE_GEMINI_API_KEY:
-        return "Chave de API do Gemini não configurada."
+        return AI_NOT_CONFIGURED_MESSAGE
     
     try:
-        model = genai.GenerativeModel('gemini-3-pro-preview')
+        model = get_genai().GenerativeModel('gemini-3-pro-preview')
         
         full_prompt = ""
         if system_message:
             full_prompt = f"{system_message}\n\n"
         full_prompt += prompt
         
-        response = model.generate_content(full_prompt)
+        # A schema makes the model answer with JSON that matches it
+        generation_config = {"response_mime_type": "application/json", "response_schema": response_schema} if response_schema else None
+        response = model.generate_content(full_prompt, generation_config=generation_config)
         return response.text
     except Exception as e:
         logging.error(f"Erro ao gerar conteúdo com Gemini: {e}")
-        return f"Erro ao processar: {str(e)}"
+        return f"{AI_ERROR_PREFIX} {str(e)}"
+
+def ai_failed(content: str) -> bool:
+    return content == AI_NOT_CONFIGURED_MESSAGE or content.startswith(AI_ERROR_PREFIX)
 
 # ============== AUTH ROUTES ==============
 
@@ -245,15 +1425,18 @@ async def login(credentials: UserLogin):
     token = create_access_token({"sub": user["id"]})
     return TokenResponse(access_token=token)
 
-@api_router.get("/auth/me", response_model=UserResponse)
-async def get_me(current_user: dict = Depends(get_current_user)):
+def user_payload(user: dict) -> UserResponse:
     return UserResponse(
-        id=current_user["id"],
-        email=current_user["email"],
-        name=current_user["name"],
-        created_at=parse_datetime(current_user["created_at"])
+        id=user["id"],
+        email=user["email"],
+        name=user["name"],
+        created_at=parse_datetime(user["created_at"])
     )
 
+@api_router.get("/auth/me", response_model=UserResponse)
+async def get_me(current_user: dict = Depends(get_current_user)):
+    return user_payload(current_user)
+
 # ============== BUSINESS ROUTES ==============
 
 @api_router.post("/business", response_model=BusinessResponse)
@@ -299,12 +1482,40 @@ async def update_business(data: BusinessCreate, current_user: dict = Depends(get
     if not result.data:
         raise HTTPException(status_code=404, detail="Negócio não encontrado")
     
+    await business_cache.invalidate(current_user["id"])
     business = result.data[0]
     business["created_at"] = parse_datetime(business["created_at"])
     return BusinessResponse(**business)
 
 # ============== LEADS ROUTES ==============
 
+def find_duplicate_lead(lead_doc: dict) -> Optional[dict]:
+    """Existing lead of the same business that the new one probably duplicates"""
+    if not LEAD_DEDUP_ON_INSERT:
+        return None
+    filters = []
+    for column in ("phone_normalized", "email_normalized"):
+        if lead_doc.get(column):
+            value = lead_doc[column].replace("\\", "\\\\").replace('"', '\\"')
+            filters.append(f'{column}.eq."{value}"')
+    if not filters:
+        return None
+    
+    # Primary, not a replica: a double submit must see the row written a moment ago
+    result = supabase.table("leads").select(f"{LEAD_COLUMNS},phone_normalized,email_normalized").eq("business_id", lead_doc["business_id"]).or_(",".join(filters)).limit(10).execute()
+    for existing in result.data or []:
+        if is_probable_duplicate(lead_doc, existing):
+            return existing
+    return None
+
+def score_new_lead(lead_doc: dict, page: Optional[dict] = None) -> float:
+    """Incremental scoring on insert; jobs.py score-leads rescores in bulk"""
+    slug = lead_doc["source"].partition(":")[2] if lead_doc["source"].startswith("landing_page:") else None
+    if slug and page is None:
+        result = supabase.table("landing_pages").select("slug,visits,conversions").eq("slug", slug).eq("business_id", lead_doc["business_id"]).execute()
+        page = result.data[0] if result.data else None
+    return score_lead(lead_doc, page_conversion_rates([page]) if page else {})
+
 @api_router.post("/leads", response_model=LeadResponse)
 async def create_lead(data: LeadCreate, current_user: dict = Depends(get_current_user)):
     business = await get_user_business(current_user)
@@ -319,33 +1530,127 @@ async def create_lead(data: LeadCreate, current_user: dict = Depends(get_current
         "interest": data.interest,
         "source": data.source,
         "status": "new",
+        "phone_normalized": normalize_phone(data.phone),
+        "email_normalized": normalize_email(data.email),
         "created_at": datetime.now(timezone.utc).isoformat()
     }
+    lead_doc["score"] = score_new_lead(lead_doc)
+    
+    duplicate = find_duplicate_lead(lead_doc)
+    if duplicate:
+        # Nothing was created; the existing lead comes back so the client can point to it
+        existing = LeadResponse(**{**duplicate, "created_at": parse_datetime(duplicate["created_at"])})
+        return ORJSONResponse(status_code=409, content={
+            "detail": f"Já existe um lead com este telefone ou e-mail: {existing.name}",
+            "lead": existing.model_dump(mode="json"),
+        })
     
     supabase.table("leads").insert(lead_doc).execute()
+    await record_write(business["id"], "leads")
+    await realtime.publish(business["id"], {
+        "type": "lead.created",
+        "lead": lead_doc,
+        "deltas": {"total_leads": 1, "leads_by_status": {"new": 1}},
+    })
     return LeadResponse(**{**lead_doc, "created_at": parse_datetime(lead_doc["created_at"])})
 
+LEAD_SORTS = ("recent", "score")
+
 @api_router.get("/leads", response_model=List[LeadResponse])
-async def get_leads(current_user: dict = Depends(get_current_user)):
+async def get_leads(
+    request: Request,
+    sort: str = Query("recent", pattern=f"^({'|'.join(LEAD_SORTS)})$"),
+    current_user: dict = Depends(get_current_user),
+):
     business = await get_user_business(current_user)
-    result = supabase.table("leads").select("*").eq("business_id", business["id"]).order("created_at", desc=True).execute()
+    etag = await version_stamps.etag(business["id"], "leads")
+    if etag_matches(request, etag):
+        return not_modified(etag)
     
-    leads = []
-    for lead in result.data:
-        lead["created_at"] = parse_datetime(lead["created_at"])
-        leads.append(LeadResponse(**lead))
+    return json_response(request, fetch_leads(business["id"], sort), etag)
+
+def fetch_leads(business_id: str, sort: str = "recent") -> list:
+    def build(db):
+        leads_query = db.table("leads").select(LEAD_COLUMNS).eq("business_id", business_id)
+        if sort == "score":
+            # Served by the (business_id, score desc, created_at desc) index, see migrations/004_lead_scores.sql
+            leads_query = leads_query.order("score", desc=True, nullsfirst=False)
+        return leads_query.order("created_at", desc=True)
     
-    return leads
+    result = db_router.read(build, sticky_key=business_id)
+    # Rows already match LeadResponse (projected columns, ISO timestamps)
+    return result.data or []
+
+def fetch_lead_search(business_id: str, query: str, status: Optional[str], limit: int, offset: int) -> list:
+    if not query:
+        # Plain listing served by the (business_id, status, created_at) index
+        def build(db):
+            leads_query = db.table("leads").select(LEAD_COLUMNS).eq("business_id", business_id)
+            if status:
+                leads_query = leads_query.eq("status", status)
+            return leads_query.order("created_at", desc=True).range(offset, offset + limit - 1)
+        return db_router.read(build, sticky_key=business_id).data or []
+    
+    # Ranked trigram/full-text search, see migrations/002_lead_search.sql
+    result = db_router.read(
+        lambda db: db.rpc("search_leads", {
+            "p_business_id": business_id,
+            "p_query": query,
+            "p_status": status,
+            "p_limit": limit,
+            "p_offset": offset,
+        }),
+        sticky_key=business_id,
+    )
+    return result.data or []
+
+@api_router.get("/leads/search")
+async def search_leads(
+    request: Request,
+    q: str = "",
+    status: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    current_user: dict = Depends(get_current_user),
+):
+    business = await get_user_business(current_user)
+    etag = await version_stamps.etag(business["id"], "leads")
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    # One extra row tells whether another page exists without counting every match
+    items = fetch_lead_search(business["id"], q.strip(), status, limit + 1, offset)
+    return json_response(request, {
+        "items": items[:limit],
+        "has_more": len(items) > limit,
+        "limit": limit,
+        "offset": offset,
+    }, etag)
 
 @api_router.put("/leads/{lead_id}/status")
 async def update_lead_status(lead_id: str, status: str, current_user: dict = Depends(get_current_user)):
     business = await get_user_business(current_user)
     
+    # The previous status is needed for the realtime counter deltas
+    current = supabase.table("leads").select("status").eq("id", lead_id).eq("business_id", business["id"]).execute()
+    if not current.data:
+        raise HTTPException(status_code=404, detail="Lead não encontrado")
+    previous_status = current.data[0]["status"]
+    
     result = supabase.table("leads").update({"status": status}).eq("id", lead_id).eq("business_id", business["id"]).execute()
+    await record_write(business["id"], "leads")
     
     if not result.data:
         raise HTTPException(status_code=404, detail="Lead não encontrado")
     
+    if previous_status != status:
+        await realtime.publish(business["id"], {
+            "type": "lead.status",
+            "lead_id": lead_id,
+            "status": status,
+            "deltas": {"leads_by_status": {previous_status: -1, status: 1}},
+        })
+    
     return {"message": "Status atualizado com sucesso"}
 
 @api_router.delete("/leads/{lead_id}")
@@ -353,10 +1658,17 @@ async def delete_lead(lead_id: str, current_user: dict = Depends(get_current_use
     business = await get_user_business(current_user)
     
     result = supabase.table("leads").delete().eq("id", lead_id).eq("business_id", business["id"]).execute()
+    await record_write(business["id"], "leads")
     
     if not result.data:
         raise HTTPException(status_code=404, detail="Lead não encontrado")
     
+    await realtime.publish(business["id"], {
+        "type": "lead.deleted",
+        "lead_id": lead_id,
+        "deltas": {"total_leads": -1, "leads_by_status": {result.data[0]["status"]: -1}},
+    })
+    
     return {"message": "Lead removido com sucesso"}
 
 # ============== CAMPAIGNS ROUTES ==============
@@ -377,19 +1689,22 @@ async def create_campaign(data: CampaignCreate, current_user: dict = Depends(get
     }
     
     supabase.table("campaigns").insert(campaign_doc).execute()
+    await record_write(business["id"], "campaigns")
+    await realtime.publish(business["id"], {"type": "campaign.created", "deltas": {"total_campaigns": 1}})
     return CampaignResponse(**{**campaign_doc, "created_at": parse_datetime(campaign_doc["created_at"])})
 
 @api_router.get("/campaigns", response_model=List[CampaignResponse])
-async def get_campaigns(current_user: dict = Depends(get_current_user)):
+async def get_campaigns(request: Request, current_user: dict = Depends(get_current_user)):
     business = await get_user_business(current_user)
-    result = supabase.table("campaigns").select("*").eq("business_id", business["id"]).execute()
-    
-    campaigns = []
-    for c in result.data:
-        c["created_at"] = parse_datetime(c["created_at"])
-        campaigns.append(CampaignResponse(**c))
+    etag = await version_stamps.etag(business["id"], "campaigns")
+    if etag_matches(request, etag):
+        return not_modified(etag)
     
-    return campaigns
+    return json_response(request, fetch_campaigns(business["id"]), etag)
+
+def fetch_campaigns(business_id: str) -> list:
+    result = supabase.table("campaigns").select(CAMPAIGN_COLUMNS).eq("business_id", business_id).execute()
+    return result.data or []
 
 # ============== LANDING PAGES ROUTES ==============
 
@@ -415,31 +1730,52 @@ async def create_landing_page(data: LandingPageCreate, current_user: dict = Depe
     }
     
     supabase.table("landing_pages").insert(page_doc).execute()
+    await record_write(business["id"], "landing_pages")
+    await realtime.publish(business["id"], {
+        "type": "page.created",
+        "page": {"slug": slug, "title": page_doc["title"], "visits": 0, "conversions": 0},
+        "deltas": {"total_pages": 1},
+    })
     return LandingPageResponse(**{**page_doc, "created_at": parse_datetime(page_doc["created_at"])})
 
 @api_router.get("/landing-pages", response_model=List[LandingPageResponse])
-async def get_landing_pages(current_user: dict = Depends(get_current_user)):
+async def get_landing_pages(request: Request, current_user: dict = Depends(get_current_user)):
     business = await get_user_business(current_user)
-    result = supabase.table("landing_pages").select("*").eq("business_id", business["id"]).execute()
+    etag = await version_stamps.etag(business["id"], "landing_pages")
+    if etag_matches(request, etag):
+        return not_modified(etag)
     
-    pages = []
-    for p in result.data:
-        p["created_at"] = parse_datetime(p["created_at"])
-        pages.append(LandingPageResponse(**p))
-    
-    return pages
+    return json_response(request, fetch_landing_pages(business["id"]), etag)
+
+def fetch_landing_pages(business_id: str) -> list:
+    result = supabase.table("landing_pages").select(LANDING_PAGE_COLUMNS).eq("business_id", business_id).execute()
+    return result.data or []
 
 # Public endpoint for landing page
 @api_router.get("/p/{slug}")
-async def get_public_landing_page(slug: str):
-    result = supabase.table("landing_pages").select("*").eq("slug", slug).execute()
+async def get_public_landing_page(slug: str, request: Request):
+    await enforce_rate_limits((f"ip:{client_ip(request)}", RATE_LIMIT_PER_IP))
+    if not SLUG_PATTERN.match(slug) or not slug_filter.might_contain(slug):
+        raise HTTPException(status_code=404, detail="Página não encontrada")
+    await enforce_rate_limits((f"slug:{slug}", RATE_LIMIT_PER_SLUG))
+    
+    result = db_router.read(
+        lambda db: db.table("landing_pages").select("*").eq("slug", slug),
+        fallback_on_empty=True,
+    )
     if not result.data:
         raise HTTPException(status_code=404, detail="Página não encontrada")
     
     page = result.data[0]
+    await enforce_rate_limits((f"business:{page['business_id']}", RATE_LIMIT_PER_BUSINESS))
     
-    # Increment visits
-    supabase.table("landing_pages").update({"visits": page["visits"] + 1}).eq("slug", slug).execute()
+    # Buffered; the leader writes the counts and bumps the ETag (see PageCounters)
+    await page_counters.add(page["id"], visits=1)
+    await realtime.publish(page["business_id"], {
+        "type": "page.visit",
+        "page": {"slug": slug, "title": page["title"], "visits": 1, "conversions": 0},
+        "deltas": {"total_visits": 1},
+    })
     
     return {
         "title": page["title"],
@@ -451,12 +1787,18 @@ async def get_public_landing_page(slug: str):
 
 # Public endpoint to capture lead from landing page
 @api_router.post("/p/{slug}/lead")
-async def capture_landing_page_lead(slug: str, data: LeadCreate):
+async def capture_landing_page_lead(slug: str, data: LeadCreate, request: Request):
+    await enforce_rate_limits((f"lead-ip:{client_ip(request)}", RATE_LIMIT_LEADS_PER_IP))
+    if not SLUG_PATTERN.match(slug) or not slug_filter.might_contain(slug):
+        raise HTTPException(status_code=404, detail="Página não encontrada")
+    await enforce_rate_limits((f"slug:{slug}", RATE_LIMIT_PER_SLUG))
+    
     result = supabase.table("landing_pages").select("*").eq("slug", slug).execute()
     if not result.data:
         raise HTTPException(status_code=404, detail="Página não encontrada")
     
     page = result.data[0]
+    await enforce_rate_limits((f"business:{page['business_id']}", RATE_LIMIT_PER_BUSINESS))
     
     lead_id = str(uuid.uuid4())
     lead_doc = {
@@ -468,75 +1810,166 @@ async def capture_landing_page_lead(slug: str, data: LeadCreate):
         "interest": data.interest or page["offer"],
         "source": f"landing_page:{slug}",
         "status": "new",
+        "phone_normalized": normalize_phone(data.phone),
+        "email_normalized": normalize_email(data.email),
         "created_at": datetime.now(timezone.utc).isoformat()
     }
+    lead_doc["score"] = score_new_lead(lead_doc, page)
+    
+    # Resubmitting the form must not create another lead or count another conversion
+    if find_duplicate_lead(lead_doc):
+        return {"message": "Cadastro realizado com sucesso!"}
     
     supabase.table("leads").insert(lead_doc).execute()
-    supabase.table("landing_pages").update({"conversions": page["conversions"] + 1}).eq("slug", slug).execute()
+    await page_counters.add(page["id"], conversions=1)
+    await record_write(page["business_id"], "leads")
+    await realtime.publish(page["business_id"], {
+        "type": "lead.created",
+        "lead": lead_doc,
+        "page": {"slug": slug, "title": page["title"], "visits": 0, "conversions": 1},
+        "deltas": {"total_leads": 1, "total_conversions": 1, "leads_by_status": {"new": 1}},
+    })
     
     return {"message": "Cadastro realizado com sucesso!"}
 
 # ============== AI INSIGHTS ROUTES ==============
 
+MARKET_INSIGHT_SYSTEM_MESSAGE = "Você é um consultor de marketing especializado em pequenos negócios brasileiros. Responda sempre em português do Brasil de forma clara e prática."
+
+# type -> (task, items to provide, JSON keys of the answer)
+MARKET_INSIGHT_SECTIONS = {
+    "trends": (
+        "Analise as principais tendências de mercado para o nicho de {niche}{location} no Brasil.",
+        ["Os 5 serviços/produtos mais procurados atualmente", "3 tendências emergentes", "Oportunidades sazonais para os próximos meses"],
+        ["servicos_populares", "tendencias", "oportunidades"],
+    ),
+    "complaints": (
+        "Analise as principais reclamações e dores dos clientes no nicho de {niche}{location}.",
+        ["As 5 principais reclamações dos clientes", "Problemas comuns com concorrentes", "Expectativas não atendidas"],
+        ["reclamacoes", "problemas_concorrentes", "expectativas"],
+    ),
+    "opportunities": (
+        "Identifique oportunidades de negócio para o nicho de {niche}{location}.",
+        ["3 nichos de público pouco explorados", "3 serviços/produtos com alta demanda e pouca oferta", "3 estratégias para se diferenciar da concorrência"],
+        ["publicos", "gaps_mercado", "diferenciais"],
+    ),
+}
+
+def market_insight_prompt(insight_type: str, niche: str, location: str) -> str:
+    task, items, keys = MARKET_INSIGHT_SECTIONS[insight_type]
+    provide = "\n".join(f"{i}. {item}" for i, item in enumerate(items, 1))
+    formatted_keys = ", ".join(f'"{key}"' for key in keys)
+    return f"""{task.format(niche=niche, location=location)}
+
+Forneça:
+{provide}
+
+Formato: JSON com as chaves {formatted_keys}"""
+
+def combined_insight_prompt(types: List[str], niche: str, location: str) -> str:
+    sections = "\n\n".join(f'Seção "{t}":\n{market_insight_prompt(t, niche, location)}' for t in types)
+    formatted_types = ", ".join(f'"{t}"' for t in types)
+    return f"""Responda às {len(types)} análises abaixo de uma só vez.
+
+{sections}
+
+Formato final: um único JSON com as chaves {formatted_types}, cada uma contendo o JSON da sua seção"""
+
+def combined_insight_schema(types: List[str]) -> dict:
+    return {
+        "type": "object",
+        "properties": {
+            t: {
+                "type": "object",
+                "properties": {key: {"type": "array", "items": {"type": "string"}} for key in MARKET_INSIGHT_SECTIONS[t][2]},
+                "required": MARKET_INSIGHT_SECTIONS[t][2],
+            }
+            for t in types
+        },
+        "required": types,
+    }
+
+def insight_cache_key(niche: str, city: Optional[str], insight_type: str) -> str:
+    return f"{resolve_niche(niche)[0]}:{resolve_city(city)[0]}:{insight_type}"
+
+async def generate_market_insights(types: List[str], niche: str, city: Optional[str]) -> dict:
+    """Content per insight type; several types share one structured Gemini call"""
+    location = f" em {city}" if city else ""
+    if len(types) == 1:
+        content = await generate_ai_content(market_insight_prompt(types[0], niche, location), MARKET_INSIGHT_SYSTEM_MESSAGE)
+        return {types[0]: content}
+    
+    content = await generate_ai_content(
+        combined_insight_prompt(types, niche, location),
+        MARKET_INSIGHT_SYSTEM_MESSAGE,
+        response_schema=combined_insight_schema(types),
+    )
+    if ai_failed(content):
+        return {t: content for t in types}
+    try:
+        sections = orjson.loads(content)
+    except orjson.JSONDecodeError as e:
+        logging.error(f"Resposta combinada do Gemini não é JSON válido: {e}")
+        return {t: f"{AI_ERROR_PREFIX} resposta inválida do modelo" for t in types}
+    return {
+        t: orjson.dumps(sections[t]).decode() if isinstance(sections.get(t), dict) else f"{AI_ERROR_PREFIX} seção ausente na resposta"
+        for t in types
+    }
+
 @api_router.post("/insights/market")
 async def get_market_insights(data: InsightRequest, current_user: dict = Depends(get_current_user)):
     business = await get_user_business(current_user)
-    location = f" em {data.city}" if data.city else ""
+    if data.type == "all":
+        types = list(MARKET_INSIGHT_SECTIONS)
+    else:
+        types = [data.type if data.type in MARKET_INSIGHT_SECTIONS else "trends"]
     
-    system_message = "Você é um consultor de marketing especializado em pequenos negócios brasileiros. Responda sempre em português do Brasil de forma clara e prática."
+    results = {}
+    if not data.refresh:
+        for t in types:
+            cached = await insight_cache.get(insight_cache_key(data.niche, data.city, t))
+            if cached is not None:
+                results[t] = cached
     
-    prompts = {
-        "trends": f"""Analise as principais tendências de mercado para o nicho de {data.niche}{location} no Brasil.
-        
-        Forneça:
-        1. Os 5 serviços/produtos mais procurados atualmente
-        2. 3 tendências emergentes
-        3. Oportunidades sazonais para os próximos meses
-        
-        Formato: JSON com as chaves "servicos_populares", "tendencias", "oportunidades"
-        """,
-        "complaints": f"""Analise as principais reclamações e dores dos clientes no nicho de {data.niche}{location}.
-        
-        Forneça:
-        1. As 5 principais reclamações dos clientes
-        2. Problemas comuns com concorrentes
-        3. Expectativas não atendidas
-        
-        Formato: JSON com as chaves "reclamacoes", "problemas_concorrentes", "expectativas"
-        """,
-        "opportunities": f"""Identifique oportunidades de negócio para o nicho de {data.niche}{location}.
-        
-        Forneça:
-        1. 3 nichos de público pouco explorados
-        2. 3 serviços/produtos com alta demanda e pouca oferta
-        3. 3 estratégias para se diferenciar da concorrência
-        
-        Formato: JSON com as chaves "publicos", "gaps_mercado", "diferenciais"
-        """
-    }
+    missing = [t for t in types if t not in results]
+    if missing:
+        # Prompts name the canonical niche and city so the cached answer fits every business sharing them
+        generated = await generate_market_insights(missing, resolve_niche(data.niche)[1], resolve_city(data.city)[1])
+        insight_docs = []
+        for t, content in generated.items():
+            results[t] = content
+            if ai_failed(content):
+                continue
+            await insight_cache.set(insight_cache_key(data.niche, data.city, t), content)
+            insight_docs.append({
+                "id": str(uuid.uuid4()),
+                "business_id": business["id"],
+                "type": t,
+                "niche": data.niche,
+                "content": content,
+                "created_at": datetime.now(timezone.utc).isoformat()
+            })
+        # Save generated insights to database
+        if insight_docs:
+            supabase.table("insights").insert(insight_docs).execute()
     
-    prompt = prompts.get(data.type, prompts["trends"])
-    response = await generate_ai_content(prompt, system_message)
-    
-    # Save insight to database
-    insight_doc = {
-        "id": str(uuid.uuid4()),
-        "business_id": business["id"],
-        "type": data.type,
-        "niche": data.niche,
-        "content": response,
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
-    supabase.table("insights").insert(insight_doc).execute()
-    
-    return {"insight": response, "type": data.type}
+    if data.type == "all":
+        return {"insights": results, "type": "all"}
+    return {"insight": results[types[0]], "type": data.type}
 
 @api_router.post("/insights/strategy")
 async def generate_strategy(data: StrategyRequest, current_user: dict = Depends(get_current_user)):
+    cache_key = insight_cache_key(data.niche, None, f"strategy:{data.insight_type}")
+    if not data.refresh:
+        cached = await insight_cache.get(cache_key)
+        if cached is not None:
+            return {"strategy": cached, "type": data.insight_type}
+    
+    niche = resolve_niche(data.niche)[1]
     system_message = "Você é um consultor de marketing especializado em pequenos negócios brasileiros. Responda sempre em português do Brasil de forma clara e prática."
     
     prompts = {
-        "campaign": f"""Crie uma campanha de marketing para um negócio no nicho de {data.niche}.
+        "campaign": f"""Crie uma campanha de marketing para um negócio no nicho de {niche}.
         
         Inclua:
         1. Nome criativo da campanha
@@ -548,7 +1981,7 @@ async def generate_strategy(data: StrategyRequest, current_user: dict = Depends(
         
         Formato: JSON com as chaves "nome", "objetivo", "publico", "oferta", "cta", "canais"
         """,
-        "content": f"""Crie 5 ideias de conteúdo para redes sociais de um negócio no nicho de {data.niche}.
+        "content": f"""Crie 5 ideias de conteúdo para redes sociais de um negócio no nicho de {niche}.
         
         Para cada ideia inclua:
         1. Tipo (Reels, Carrossel, Stories, Post)
@@ -558,7 +1991,7 @@ async def generate_strategy(data: StrategyRequest, current_user: dict = Depends(
         
         Formato: JSON array com as chaves "tipo", "tema", "gancho", "hashtags"
         """,
-        "promotion": f"""Crie 3 estratégias promocionais para um negócio no nicho de {data.niche}.
+        "promotion": f"""Crie 3 estratégias promocionais para um negócio no nicho de {niche}.
         
         Para cada estratégia inclua:
         1. Nome da promoção
@@ -572,26 +2005,30 @@ async def generate_strategy(data: StrategyRequest, current_user: dict = Depends(
     
     prompt = prompts.get(data.insight_type, prompts["campaign"])
     response = await generate_ai_content(prompt, system_message)
+    if not ai_failed(response):
+        await insight_cache.set(cache_key, response)
     
     return {"strategy": response, "type": data.insight_type}
 
 # ============== REPORTS ROUTES ==============
 
-@api_router.get("/reports/dashboard")
-async def get_dashboard_data(current_user: dict = Depends(get_current_user)):
-    business = await get_user_business(current_user)
-    
+DASHBOARD_SCOPES = ("leads", "campaigns", "landing_pages")
+
+def build_dashboard(business_id: str) -> dict:
     # Get counts
-    leads_result = supabase.table("leads").select("id", count="exact").eq("business_id", business["id"]).execute()
-    campaigns_result = supabase.table("campaigns").select("id", count="exact").eq("business_id", business["id"]).execute()
-    pages_result = supabase.table("landing_pages").select("*").eq("business_id", business["id"]).execute()
+    leads_result = db_router.read(lambda db: db.table("leads").select("id", count="exact").eq("business_id", business_id), sticky_key=business_id)
+    campaigns_result = db_router.read(lambda db: db.table("campaigns").select("id", count="exact").eq("business_id", business_id), sticky_key=business_id)
+    pages_result = db_router.read(lambda db: db.table("landing_pages").select("*").eq("business_id", business_id), sticky_key=business_id)
     
     leads_count = leads_result.count or 0
     campaigns_count = campaigns_result.count or 0
     pages_count = len(pages_result.data) if pages_result.data else 0
     
     # Get recent leads
-    recent_leads_result = supabase.table("leads").select("*").eq("business_id", business["id"]).order("created_at", desc=True).limit(5).execute()
+    recent_leads_result = db_router.read(
+        lambda db: db.table("leads").select(LEAD_COLUMNS).eq("business_id", business_id).order("created_at", desc=True).limit(5),
+        sticky_key=business_id,
+    )
     recent_leads = recent_leads_result.data if recent_leads_result.data else []
     
     # Get landing page stats
@@ -602,7 +2039,7 @@ async def get_dashboard_data(current_user: dict = Depends(get_current_user)):
     conversion_rate = (total_conversions / total_visits * 100) if total_visits > 0 else 0
     
     # Get leads by status
-    all_leads = supabase.table("leads").select("status").eq("business_id", business["id"]).execute()
+    all_leads = db_router.read(lambda db: db.table("leads").select("status").eq("business_id", business_id), sticky_key=business_id)
     status_counts = {}
     if all_leads.data:
         for lead in all_leads.data:
@@ -620,7 +2057,122 @@ async def get_dashboard_data(current_user: dict = Depends(get_current_user)):
         },
         "recent_leads": recent_leads,
         "leads_by_status": status_counts,
-        "pages_performance": [{"title": p["title"], "visits": p["visits"], "conversions": p["conversions"]} for p in pages]
+        "pages_performance": [{"slug": p["slug"], "title": p["title"], "visits": p["visits"], "conversions": p["conversions"]} for p in pages]
+    }
+
+@api_router.get("/reports/dashboard")
+async def get_dashboard_data(request: Request, current_user: dict = Depends(get_current_user)):
+    business = await get_user_business(current_user)
+    etag = await version_stamps.etag(business["id"], *DASHBOARD_SCOPES)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    return json_response(request, build_dashboard(business["id"]), etag)
+
+TIMESERIES_STEPS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+TIMESERIES_DEFAULT_BUCKETS = {"hour": 24, "day": 30}
+
+def bucket_floor(dt: datetime, granularity: str) -> datetime:
+    dt = dt.astimezone(timezone.utc) if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+    if granularity == "hour":
+        return dt.replace(minute=0, second=0, microsecond=0)
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def fetch_timeseries(business_id: str, metric: str, granularity: str, start: datetime, end: datetime, group_by: str = "status") -> list:
+    """Dense list of UTC buckets in [start, end) read from the rollup tables"""
+    step = TIMESERIES_STEPS[granularity]
+    first = bucket_floor(start, granularity)
+    series = {}
+    cursor = first
+    while cursor < end:
+        if metric == "leads":
+            series[cursor] = {"bucket": cursor.isoformat(), "total": 0, "by": {}}
+        else:
+            series[cursor] = {"bucket": cursor.isoformat(), "visits": 0, "conversions": 0, "by": {}}
+        cursor += step
+    
+    if metric == "leads":
+        rows = db_router.read_all(
+            lambda db: db.table("lead_rollups").select("bucket_start,source,status,leads")
+                .eq("business_id", business_id).eq("granularity", granularity)
+                .gte("bucket_start", first.isoformat()).lt("bucket_start", end.isoformat())
+                .order("bucket_start").order("source").order("status"),
+            sticky_key=business_id,
+        )
+        for row in rows:
+            entry = series.get(bucket_floor(parse_datetime(row["bucket_start"]), granularity))
+            if entry is None:
+                continue
+            entry["total"] += row["leads"]
+            entry["by"][row[group_by]] = entry["by"].get(row[group_by], 0) + row["leads"]
+    else:
+        rows = db_router.read_all(
+            lambda db: db.table("page_rollups").select("bucket_start,page_id,visits,conversions")
+                .eq("business_id", business_id).eq("granularity", granularity)
+                .gte("bucket_start", first.isoformat()).lt("bucket_start", end.isoformat())
+                .order("bucket_start").order("page_id"),
+            sticky_key=business_id,
+        )
+        for row in rows:
+            entry = series.get(bucket_floor(parse_datetime(row["bucket_start"]), granularity))
+            if entry is None:
+                continue
+            entry["visits"] += row["visits"]
+            entry["conversions"] += row["conversions"]
+            entry["by"][row["page_id"]] = {"visits": row["visits"], "conversions": row["conversions"]}
+    
+    return list(series.values())
+
+@api_router.get("/reports/timeseries")
+async def get_timeseries(
+    request: Request,
+    metric: str = "leads",  # leads, pages
+    granularity: str = "day",  # hour, day
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    group_by: str = "status",  # status, source (leads only)
+    current_user: dict = Depends(get_current_user),
+):
+    if metric not in ("leads", "pages"):
+        raise HTTPException(status_code=400, detail="Métrica inválida. Use leads ou pages.")
+    if granularity not in TIMESERIES_STEPS:
+        raise HTTPException(status_code=400, detail="Granularidade inválida. Use hour ou day.")
+    if group_by not in ("status", "source"):
+        raise HTTPException(status_code=400, detail="Agrupamento inválido. Use status ou source.")
+    
+    step = TIMESERIES_STEPS[granularity]
+    # Naive datetimes are taken as UTC; by default the range ends with the current bucket
+    if end is None:
+        end = bucket_floor(datetime.now(timezone.utc), granularity) + step
+    elif end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    if start is None:
+        start = end - step * TIMESERIES_DEFAULT_BUCKETS[granularity]
+    elif start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="O início deve ser anterior ao fim do intervalo.")
+    if (end - start) / step > MAX_TIMESERIES_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Intervalo muito grande (máximo de {MAX_TIMESERIES_BUCKETS} períodos).")
+    
+    business = await get_user_business(current_user)
+    buckets = fetch_timeseries(business["id"], metric, granularity, start, end, group_by)
+    return json_response(request, {"metric": metric, "granularity": granularity, "buckets": buckets})
+
+REPORT_PERIOD_DAYS = {"daily": 1, "weekly": 7, "monthly": 30}
+
+def period_lead_totals(business_id: str, period: str) -> Optional[dict]:
+    """Leads created in the report period and in the period before it"""
+    days = REPORT_PERIOD_DAYS.get(period, 7)
+    end = bucket_floor(datetime.now(timezone.utc), "day") + timedelta(days=1)
+    try:
+        buckets = fetch_timeseries(business_id, "leads", "day", end - timedelta(days=2 * days), end)
+    except Exception as e:
+        logging.warning(f"Rollups indisponíveis para o relatório: {e}")
+        return None
+    return {
+        "previous": sum(b["total"] for b in buckets[:days]),
+        "current": sum(b["total"] for b in buckets[days:]),
     }
 
 @api_router.post("/reports/generate")
@@ -628,7 +2180,11 @@ async def generate_report(data: ReportRequest, current_user: dict = Depends(get_
     business = await get_user_business(current_user)
     
     # Get dashboard data
-    dashboard = await get_dashboard_data(current_user)
+    dashboard = build_dashboard(business["id"])
+    period_totals = period_lead_totals(business["id"], data.period)
+    period_lines = ""
+    if period_totals is not None:
+        period_lines = f"\n    - Novos leads no período: {period_totals['current']} (período anterior: {period_totals['previous']})"
     
     period_text = {
         "daily": "do dia",
@@ -646,7 +2202,7 @@ async def generate_report(data: ReportRequest, current_user: dict = Depends(get_
     - Páginas de captura: {dashboard['overview']['total_pages']}
     - Visitas totais: {dashboard['overview']['total_visits']}
     - Conversões: {dashboard['overview']['total_conversions']}
-    - Taxa de conversão: {dashboard['overview']['conversion_rate']}%
+    - Taxa de conversão: {dashboard['overview']['conversion_rate']}%{period_lines}
     
     Inclua:
     1. Resumo executivo (2-3 frases)
@@ -669,8 +2225,10 @@ async def generate_report(data: ReportRequest, current_user: dict = Depends(get_
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     supabase.table("reports").insert(report_doc).execute()
+    await record_write(business["id"], "reports")
     
     return {
+        "id": report_doc["id"],
         "report": response,
         "data": dashboard,
         "period": data.period,
@@ -678,13 +2236,155 @@ async def generate_report(data: ReportRequest, current_user: dict = Depends(get_
     }
 
 @api_router.get("/reports/history")
-async def get_reports_history(current_user: dict = Depends(get_current_user)):
+async def get_reports_history(request: Request, current_user: dict = Depends(get_current_user)):
     business = await get_user_business(current_user)
+    etag = await version_stamps.etag(business["id"], "reports")
+    if etag_matches(request, etag):
+        return not_modified(etag)
     
-    result = supabase.table("reports").select("*").eq("business_id", business["id"]).order("created_at", desc=True).limit(10).execute()
-    
+    return json_response(request, fetch_reports_history(business["id"]), etag)
+
+# Metadata only; the dashboard snapshot and analysis come from /reports/{report_id}
+REPORT_SUMMARY_COLUMNS = "id,period,created_at,total_leads:data->overview->total_leads"
+
+def fetch_reports_history(business_id: str) -> list:
+    result = db_router.read(
+        lambda db: db.table("reports").select(REPORT_SUMMARY_COLUMNS).eq("business_id", business_id).order("created_at", desc=True).limit(10),
+        sticky_key=business_id,
+    )
     return result.data if result.data else []
 
+@api_router.get("/reports/{report_id}")
+async def get_report(report_id: str, request: Request, current_user: dict = Depends(get_current_user)):
+    business = await get_user_business(current_user)
+    etag = await version_stamps.etag(business["id"], "reports")
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    result = db_router.read(
+        lambda db: db.table("reports").select("id,period,data,analysis,created_at").eq("id", report_id).eq("business_id", business["id"]),
+        sticky_key=business["id"],
+    )
+    if not result.data:
+        # Reports past REPORT_RETENTION_DAYS live in the Parquet archive (jobs.py archive)
+        raise HTTPException(status_code=404, detail="Relatório não encontrado")
+    
+    report = result.data[0]
+    # Same shape as /reports/generate
+    return json_response(request, {
+        "id": report["id"],
+        "report": report["analysis"],
+        "data": report["data"],
+        "period": report["period"],
+        "generated_at": report["created_at"],
+    }, etag)
+
+# ============== REALTIME ROUTES ==============
+
+@api_router.post("/realtime/token")
+async def realtime_token(current_user: dict = Depends(get_current_user)):
+    return {"token": create_stream_token(current_user["id"]), "expires_in": REALTIME_TOKEN_TTL_SECONDS}
+
+@api_router.get("/realtime/stream")
+async def realtime_stream(request: Request, token: Optional[str] = None):
+    # EventSource cannot send headers, so it passes a stream token from /realtime/token in
+    # the query string; the full access token is only accepted in the header
+    authorization = request.headers.get("authorization", "")
+    if token:
+        current_user = await user_from_token(token, scope="realtime")
+    elif authorization.startswith("Bearer "):
+        current_user = await user_from_token(authorization.removeprefix("Bearer ").strip())
+    else:
+        raise HTTPException(status_code=401, detail="Token ausente")
+    business = await get_user_business(current_user)
+    business_id = business["id"]
+    
+    async def event_stream():
+        queue = realtime.subscribe(business_id)
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=REALTIME_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {orjson.dumps(event).decode()}\n\n"
+        finally:
+            realtime.unsubscribe(business_id, queue)
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+        # Marks the stream as encoded so GZipMiddleware does not buffer it
+        "Content-Encoding": "identity",
+    })
+
+# ============== BATCH ROUTES ==============
+
+def batch_leads(user: dict, business: dict, params: dict) -> list:
+    sort = params.get("sort", "recent")
+    if sort not in LEAD_SORTS:
+        raise HTTPException(status_code=422, detail=f"Ordenação inválida: {sort}")
+    return fetch_leads(business["id"], sort)
+
+# path -> (needs business, ETag scopes, handler(user, business, query params)); handlers block, so they run in threads
+BATCH_READS = {
+    "/auth/me": (False, (), lambda user, business, params: user_payload(user).model_dump(mode="json")),
+    "/business": (True, (), lambda user, business, params: BusinessResponse(**business).model_dump(mode="json")),
+    "/leads": (True, ("leads",), batch_leads),
+    "/campaigns": (True, ("campaigns",), lambda user, business, params: fetch_campaigns(business["id"])),
+    "/landing-pages": (True, ("landing_pages",), lambda user, business, params: fetch_landing_pages(business["id"])),
+    "/reports/dashboard": (True, DASHBOARD_SCOPES, lambda user, business, params: build_dashboard(business["id"])),
+    "/reports/history": (True, ("reports",), lambda user, business, params: fetch_reports_history(business["id"])),
+}
+
+def batch_route(path: str):
+    """Route path and its query parameters (last value wins) of a sub-request"""
+    parsed = urlsplit(path)
+    return parsed.path, dict(parse_qsl(parsed.query))
+
+async def run_batch_read(sub: BatchSubRequest, user: dict, business: Optional[dict], business_error: Optional[HTTPException]) -> dict:
+    path, params = batch_route(sub.path)
+    if path not in BATCH_READS:
+        return {"id": sub.id, "status": 404, "body": {"detail": f"Rota não suportada em lote: {sub.path}"}}
+    
+    needs_business, scopes, handler = BATCH_READS[path]
+    if needs_business and business is None:
+        return {"id": sub.id, "status": business_error.status_code, "body": {"detail": business_error.detail}}
+    
+    etag = await version_stamps.etag(business["id"], *scopes) if scopes else None
+    if etag and etag_in(sub.if_none_match, etag):
+        return {"id": sub.id, "status": 304, "etag": etag}
+    
+    try:
+        body = await asyncio.to_thread(handler, user, business, params)
+    except HTTPException as e:
+        return {"id": sub.id, "status": e.status_code, "body": {"detail": e.detail}}
+    except Exception as e:
+        logging.error(f"Erro na sub-requisição {sub.path}: {e}")
+        return {"id": sub.id, "status": 500, "body": {"detail": "Erro interno"}}
+    
+    response = {"id": sub.id, "status": 200, "body": body}
+    if etag:
+        response["etag"] = etag
+    return response
+
+@api_router.post("/batch")
+async def batch_reads(data: BatchRequest, request: Request, current_user: dict = Depends(get_current_user)):
+    # Identity and business are resolved once for every sub-request
+    business, business_error = None, None
+    if any(BATCH_READS.get(batch_route(sub.path)[0], (False,))[0] for sub in data.requests):
+        try:
+            business = await get_user_business(current_user)
+        except HTTPException as e:
+            business_error = e
+    
+    responses = await asyncio.gather(*(
+        run_batch_read(sub, current_user, business, business_error) for sub in data.requests
+    ))
+    return json_response(request, {"responses": responses})
+
 # ============== ROOT ROUTE ==============
 
 @api_router.get("/")
@@ -693,19 +2393,79 @@ async def root():
 
 @api_router.get("/health")
 async def health():
-    return {"status": "healthy"}
-
-# Configure CORS BEFORE including router
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+    return {
+        "status": "healthy",
+        "replicas": db_router.status(),
+        "load": load_monitor.status(),
+        "worker": {"pid": os.getpid(), "leader": leader.is_leader, "shared_state": shared_state.is_shared},
+    }
+
+# ============== APP FACTORY ==============
+
+def warm_up_clients():
+    for name, client in [("primário", supabase)] + db_router.replicas:
+        try:
+            client.warm_up()
+        except Exception as e:
+            logging.warning(f"Não foi possível pré-aquecer a conexão {name}: {e}")
+            if client is not supabase:
+                db_router.mark_down(name)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.to_thread(warm_up_clients)
+    await shared_state.start()
+    await realtime.start()
+    background_tasks = [
+        asyncio.create_task(load_monitor.run()),
+        asyncio.create_task(slug_filter_loop()),
+        asyncio.create_task(leader.run()),
+        asyncio.create_task(counter_flush_loop()),
+    ]
+    if db_router.replicas:
+        background_tasks.append(asyncio.create_task(replica_health_loop()))
+    
+    yield
+    
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    if leader.is_leader:
+        # Counts buffered since the last flush would otherwise wait for the next leader
+        await page_counters.flush()
+        await leader.resign()
+    await realtime.stop()
+    await shared_state.stop()
+    await rate_limiter.close()
+    db_router.close()
+    supabase.close()
+
+def create_app() -> FastAPI:
+    application = FastAPI(title="Radar de Clientes API", lifespan=lifespan)
+    
+    # Inside CORS, so cross-origin landing pages can read the 503 and its Retry-After;
+    # everything else stays outside the shed requests
+    application.add_middleware(LoadShedMiddleware)
+    
+    # Configure CORS BEFORE including router
+    application.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["Retry-After"],
+    )
+    
+    # Compress large responses that were not already brotli-encoded
+    application.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+    
+    # Include the router in the main app
+    application.include_router(api_router)
+    return application
 
-# Include the router in the main app
-app.include_router(api_router)
+# `uvicorn server:app` keeps working; `uvicorn server:create_app --factory` is equivalent
+app = create_app()
 
 # Configure logging
 logging.basicConfig(
@@ -1,4 +1,4 @@
-import React, { createContext, useContext, useState, useEffect, useMemo } from 'react';
+import React, { createContext, useContext, useState, useEffect, useMemo, useRef } from 'react';
 import axios from 'axios';
 
 const AuthContext = createContext(null);
@@ -24,6 +24,32 @@ export const AuthProvider = ({ children }) => {
     return instance;
   }, [token]);
 
+  // Last body and ETag per batched path, so unchanged resources come back as 304
+  const batchCache = useRef({});
+
+  // Fetches several read endpoints in a single round-trip.
+  // Returns { [path]: { status, body } }.
+  const batch = async (paths) => {
+    const requests = paths.map((path) => ({
+      id: path,
+      path,
+      if_none_match: batchCache.current[path]?.etag
+    }));
+    const response = await api.post('/batch', { requests });
+    const results = {};
+    response.data.responses.forEach((res) => {
+      if (res.status === 304) {
+        results[res.id] = { status: 200, body: batchCache.current[res.id].body };
+        return;
+      }
+      if (res.status === 200 && res.etag) {
+        batchCache.current[res.id] = { etag: res.etag, body: res.body };
+      }
+      results[res.id] = res;
+    });
+    return results;
+  };
+
   useEffect(() => {
     if (token) {
       fetchUser();
@@ -34,15 +60,12 @@ export const AuthProvider = ({ children }) => {
 
   const fetchUser = async () => {
     try {
-      const response = await api.get('/auth/me');
-      setUser(response.data);
-      
-      try {
-        const bizResponse = await api.get('/business');
-        setBusiness(bizResponse.data);
-      } catch (e) {
-        setBusiness(null);
+      const results = await batch(['/auth/me', '/business']);
+      if (results['/auth/me'].status !== 200) {
+        throw new Error(results['/auth/me'].body?.detail);
       }
+      setUser(results['/auth/me'].body);
+      setBusiness(results['/business'].status === 200 ? results['/business'].body : null);
     } catch (error) {
       logout();
     } finally {
@@ -67,6 +90,7 @@ export const AuthProvider = ({ children }) => {
   };
 
   const logout = () => {
+    batchCache.current = {};
     localStorage.removeItem('token');
     setToken(null);
     setUser(null);
@@ -92,6 +116,7 @@ export const AuthProvider = ({ children }) => {
       loading,
       token,
       api,
+      batch,
       login,
       register,
       logout,
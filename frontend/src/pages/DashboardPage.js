@@ -11,8 +11,51 @@ import {
 } from 'lucide-react';
 import { useNavigate } from 'react-router-dom';
 
+const API_URL = process.env.REACT_APP_BACKEND_URL;
+
+const REALTIME_RETRY_MS = 3000;
+const REALTIME_EVENTS = ['lead.created', 'lead.status', 'lead.deleted', 'campaign.created', 'page.created', 'page.visit'];
+
+// Applies a pushed event (counter deltas, new/changed leads and pages) to the loaded dashboard
+const applyRealtimeEvent = (data, event) => {
+  if (!data) return data;
+
+  const overview = { ...data.overview };
+  const leadsByStatus = { ...data.leads_by_status };
+  Object.entries(event.deltas || {}).forEach(([key, delta]) => {
+    if (key === 'leads_by_status') {
+      Object.entries(delta).forEach(([status, n]) => {
+        leadsByStatus[status] = (leadsByStatus[status] || 0) + n;
+      });
+    } else {
+      overview[key] = (overview[key] || 0) + delta;
+    }
+  });
+  overview.conversion_rate = overview.total_visits > 0
+    ? Math.round((overview.total_conversions / overview.total_visits) * 10000) / 100
+    : 0;
+
+  let recentLeads = data.recent_leads || [];
+  if (event.type === 'lead.created') recentLeads = [event.lead, ...recentLeads].slice(0, 5);
+  if (event.type === 'lead.deleted') recentLeads = recentLeads.filter(l => l.id !== event.lead_id);
+  if (event.type === 'lead.status') {
+    recentLeads = recentLeads.map(l => l.id === event.lead_id ? { ...l, status: event.status } : l);
+  }
+
+  let pages = data.pages_performance || [];
+  if (event.type === 'page.created') {
+    pages = [...pages, event.page];
+  } else if (event.page) {
+    pages = pages.map(p => p.slug === event.page.slug
+      ? { ...p, visits: p.visits + event.page.visits, conversions: p.conversions + event.page.conversions }
+      : p);
+  }
+
+  return { ...data, overview, leads_by_status: leadsByStatus, recent_leads: recentLeads, pages_performance: pages };
+};
+
 const DashboardPage = () => {
-  const { api, business, user } = useAuth();
+  const { api, business, user, token } = useAuth();
   const navigate = useNavigate();
   const [loading, setLoading] = useState(true);
   const [dashboardData, setDashboardData] = useState(null);
@@ -22,6 +65,49 @@ const DashboardPage = () => {
     fetchDashboard();
   }, []);
 
+  useEffect(() => {
+    if (!token || typeof EventSource === 'undefined') return undefined;
+
+    let source = null;
+    let retryTimer = null;
+    let closed = false;
+    const handleEvent = (message) => {
+      const event = JSON.parse(message.data);
+      setDashboardData((current) => applyRealtimeEvent(current, event));
+    };
+    const reconnect = () => {
+      if (closed) return;
+      // Events may have been missed while disconnected
+      retryTimer = setTimeout(() => {
+        fetchDashboard();
+        connect();
+      }, REALTIME_RETRY_MS);
+    };
+    // The URL carries a short-lived stream token, so every (re)connection asks for a new one
+    const connect = async () => {
+      try {
+        const response = await api.post('/realtime/token');
+        if (closed) return;
+        source = new EventSource(`${API_URL}/api/realtime/stream?token=${encodeURIComponent(response.data.token)}`);
+        REALTIME_EVENTS.forEach((type) => source.addEventListener(type, handleEvent));
+        source.addEventListener('resync', fetchDashboard);
+        source.onerror = () => {
+          source.close();
+          reconnect();
+        };
+      } catch (error) {
+        reconnect();
+      }
+    };
+    connect();
+
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      if (source) source.close();
+    };
+  }, [token]);
+
   const fetchDashboard = async () => {
     try {
       const response = await api.get('/reports/dashboard');
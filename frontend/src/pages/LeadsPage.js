@@ -14,11 +14,11 @@ import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from '.
 import { toast } from 'sonner';
 import { 
   Users, PlusCircle, Trash2, Phone, Mail, Link2, 
-  ExternalLink, Eye, Target, FileText, Copy, Check
+  ExternalLink, Eye, Target, FileText, Copy, Check, Search
 } from 'lucide-react';
 
 const LeadsPage = () => {
-  const { api } = useAuth();
+  const { api, batch } = useAuth();
   const [loading, setLoading] = useState(true);
   const [leads, setLeads] = useState([]);
   const [landingPages, setLandingPages] = useState([]);
@@ -30,19 +30,44 @@ const LeadsPage = () => {
     title: '', headline: '', description: '', offer: '', cta_text: 'Quero Participar' 
   });
   const [copied, setCopied] = useState(null);
+  const [searchQuery, setSearchQuery] = useState('');
+  const [searchResults, setSearchResults] = useState(null);
+  const [sortBy, setSortBy] = useState('recent');
 
   useEffect(() => {
     fetchData();
-  }, []);
+  }, [sortBy]);
+
+  // Search runs on the server (indexed), debounced while the user types
+  useEffect(() => {
+    const query = searchQuery.trim();
+    if (!query) {
+      setSearchResults(null);
+      return undefined;
+    }
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const response = await api.get('/leads/search', { params: { q: query, limit: 50 } });
+        if (!cancelled) setSearchResults(response.data.items);
+      } catch (error) {
+        console.error('Erro ao buscar leads:', error);
+      }
+    }, 300);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchQuery]);
+
+  const visibleLeads = searchResults ?? leads;
 
   const fetchData = async () => {
     try {
-      const [leadsRes, pagesRes] = await Promise.all([
-        api.get('/leads'),
-        api.get('/landing-pages')
-      ]);
-      setLeads(leadsRes.data);
-      setLandingPages(pagesRes.data);
+      const leadsPath = sortBy === 'score' ? '/leads?sort=score' : '/leads';
+      const results = await batch([leadsPath, '/landing-pages']);
+      if (results[leadsPath].status === 200) setLeads(results[leadsPath].body);
+      if (results['/landing-pages'].status === 200) setLandingPages(results['/landing-pages'].body);
     } catch (error) {
       console.error('Erro ao carregar dados:', error);
     } finally {
@@ -59,6 +84,15 @@ const LeadsPage = () => {
       setShowAddLead(false);
       toast.success('Lead adicionado!');
     } catch (error) {
+      if (error.response?.status === 409) {
+        // Probable duplicate: nothing was created, show the lead that already exists
+        const existing = error.response.data.lead;
+        setLeads([existing, ...leads.filter(l => l.id !== existing.id)]);
+        setNewLead({ name: '', email: '', phone: '', interest: '' });
+        setShowAddLead(false);
+        toast.info(error.response.data.detail);
+        return;
+      }
       toast.error(error.response?.data?.detail || 'Erro ao adicionar lead');
     }
   };
@@ -67,6 +101,7 @@ const LeadsPage = () => {
     try {
       await api.delete(`/leads/${leadId}`);
       setLeads(leads.filter(l => l.id !== leadId));
+      setSearchResults(results => results && results.filter(l => l.id !== leadId));
       toast.success('Lead removido');
     } catch (error) {
       toast.error('Erro ao remover lead');
@@ -77,6 +112,7 @@ const LeadsPage = () => {
     try {
       await api.put(`/leads/${leadId}/status?status=${status}`);
       setLeads(leads.map(l => l.id === leadId ? {...l, status} : l));
+      setSearchResults(results => results && results.map(l => l.id === leadId ? {...l, status} : l));
       toast.success('Status atualizado');
     } catch (error) {
       toast.error('Erro ao atualizar status');
@@ -245,6 +281,30 @@ const LeadsPage = () => {
                 </div>
               ) : (
                 <div className="overflow-x-auto">
+                  <div className="flex gap-2 mb-4">
+                    <div className="relative flex-1">
+                      <Search className="w-4 h-4 absolute left-3 top-1/2 -translate-y-1/2 text-muted-foreground" />
+                      <Input
+                        placeholder="Buscar por nome, email, telefone ou interesse"
+                        className="pl-9"
+                        data-testid="lead-search-input"
+                        value={searchQuery}
+                        onChange={(e) => setSearchQuery(e.target.value)}
+                      />
+                    </div>
+                    <Select value={sortBy} onValueChange={setSortBy}>
+                      <SelectTrigger className="w-44" data-testid="lead-sort-select">
+                        <SelectValue />
+                      </SelectTrigger>
+                      <SelectContent>
+                        <SelectItem value="recent">Mais recentes</SelectItem>
+                        <SelectItem value="score">Maior prioridade</SelectItem>
+                      </SelectContent>
+                    </Select>
+                  </div>
+                  {visibleLeads.length === 0 && (
+                    <p className="text-center text-muted-foreground py-8">Nenhum lead encontrado</p>
+                  )}
                   <Table>
                     <TableHeader>
                       <TableRow>
@@ -252,12 +312,13 @@ const LeadsPage = () => {
                         <TableHead>Contato</TableHead>
                         <TableHead>Interesse</TableHead>
                         <TableHead>Origem</TableHead>
+                        <TableHead>Score</TableHead>
                         <TableHead>Status</TableHead>
                         <TableHead></TableHead>
                       </TableRow>
                     </TableHeader>
                     <TableBody>
-                      {leads.map((lead) => (
+                      {visibleLeads.map((lead) => (
                         <TableRow key={lead.id} data-testid={`lead-row-${lead.id}`}>
                           <TableCell className="font-medium">{lead.name}</TableCell>
                           <TableCell>
@@ -280,6 +341,9 @@ const LeadsPage = () => {
                               {lead.source === 'manual' ? 'Manual' : 'Página'}
                             </Badge>
                           </TableCell>
+                          <TableCell className="font-medium">
+                            {lead.score != null ? Math.round(lead.score) : '-'}
+                          </TableCell>
                           <TableCell>
                             <Select
                               value={lead.status}
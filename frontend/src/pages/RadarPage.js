@@ -32,13 +32,17 @@ const RadarPage = () => {
       const response = await api.post('/insights/market', {
         niche: business.niche,
         city: business.city,
-        type: type
+        type: type,
+        // "Atualizar" asks for a fresh analysis instead of the cached one
+        refresh: type !== 'all' && Boolean(insights[type])
       });
       
-      setInsights(prev => ({
-        ...prev,
-        [type]: response.data.insight
-      }));
+      // "all" answers the three tabs with a single AI call
+      setInsights(prev => (
+        type === 'all'
+          ? { ...prev, ...response.data.insights }
+          : { ...prev, [type]: response.data.insight }
+      ));
       toast.success('Análise concluída!');
     } catch (error) {
       toast.error('Erro ao gerar análise');
@@ -124,12 +128,28 @@ const RadarPage = () => {
             Descubra o que seu público está buscando e do que está reclamando
           </p>
         </div>
-        {business && (
-          <Badge variant="outline" className="text-sm py-1 px-3">
-            <Target className="w-4 h-4 mr-2" />
-            {business.niche?.replace(/_/g, ' ')}
-          </Badge>
-        )}
+        <div className="flex items-center gap-2">
+          {business && (
+            <Badge variant="outline" className="text-sm py-1 px-3">
+              <Target className="w-4 h-4 mr-2" />
+              {business.niche?.replace(/_/g, ' ')}
+            </Badge>
+          )}
+          <Button
+            onClick={() => fetchInsight('all')}
+            disabled={loading}
+            variant="outline"
+            className="rounded-full"
+            data-testid="analyze-all-btn"
+          >
+            {loading ? (
+              <Loader2 className="w-4 h-4 mr-2 animate-spin" />
+            ) : (
+              <Search className="w-4 h-4 mr-2" />
+            )}
+            Analisar tudo
+          </Button>
+        </div>
       </div>
 
       {/* Tabs */}
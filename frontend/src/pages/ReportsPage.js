@@ -20,21 +20,34 @@ const ReportsPage = () => {
   const [reportHistory, setReportHistory] = useState([]);
 
   useEffect(() => {
-    fetchHistory();
+    fetchHistory(true);
   }, []);
 
-  const fetchHistory = async () => {
+  // The history only carries metadata; full reports are loaded on demand
+  const fetchHistory = async (openLatest = false) => {
     try {
       const response = await api.get('/reports/history');
       setReportHistory(response.data);
-      if (response.data.length > 0) {
-        setCurrentReport(response.data[0]);
+      if (openLatest && response.data.length > 0) {
+        openReport(response.data[0].id);
       }
     } catch (error) {
       console.error('Erro ao carregar histórico:', error);
     }
   };
 
+  const openReport = async (reportId) => {
+    setLoading(true);
+    try {
+      const response = await api.get(`/reports/${reportId}`);
+      setCurrentReport(response.data);
+    } catch (error) {
+      toast.error('Erro ao carregar relatório');
+    } finally {
+      setLoading(false);
+    }
+  };
+
   const generateReport = async () => {
     if (!business) {
       toast.error('Configure seu negócio primeiro');
@@ -227,7 +240,7 @@ const ReportsPage = () => {
                 <div 
                   key={report.id || index}
                   className="flex items-center justify-between p-4 rounded-2xl bg-muted/50 hover:bg-muted transition-colors cursor-pointer"
-                  onClick={() => setCurrentReport(report)}
+                  onClick={() => openReport(report.id)}
                   data-testid={`report-history-${index}`}
                 >
                   <div className="flex items-center gap-3">
@@ -241,7 +254,7 @@ const ReportsPage = () => {
                       </p>
                     </div>
                   </div>
-                  <Badge variant="outline">{report.data?.overview?.total_leads || 0} leads</Badge>
+                  <Badge variant="outline">{report.total_leads || 0} leads</Badge>
                 </div>
               ))}
             </div>
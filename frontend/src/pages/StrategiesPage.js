@@ -32,7 +32,9 @@ const StrategiesPage = () => {
     try {
       const response = await api.post('/insights/strategy', {
         niche: business.niche,
-        insight_type: type
+        insight_type: type,
+        // Generating again asks for a new strategy instead of the cached one
+        refresh: Boolean(strategies[type])
       });
       
       setStrategies(prev => ({
@@ -0,0 +1,10 @@
+import os
+import sys
+from pathlib import Path
+
+# Backend modules import each other by bare name, as when run from backend/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+# Placeholder credentials; unit tests never hit the network
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test.test.test")
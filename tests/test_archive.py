@@ -0,0 +1,58 @@
+import asyncio
+from argparse import Namespace
+
+import pandas as pd
+import pytest
+
+import jobs
+from server import shared_state, version_stamps
+
+
+def lead(lead_id, created_at, **fields):
+    base = {
+        "id": lead_id, "business_id": "b1", "name": "Ana", "email": None, "phone": None, "interest": None,
+        "source": "manual", "status": "lost", "score": None, "created_at": created_at,
+        "phone_digits": "", "search_text": "ana",
+    }
+    return {**base, **fields}
+
+
+@pytest.fixture(autouse=True)
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "ARCHIVE_DIR", tmp_path)
+    return tmp_path
+
+
+def test_partitions_with_only_nulls_read_back_as_one_dataset(archive_dir):
+    jobs.write_archive("leads", "b1", [lead("1", "2024-01-05T10:00:00+00:00")])
+    jobs.write_archive("leads", "b2", [lead("2", "2024-02-05T10:00:00+00:00", business_id="b2", email="a@b.com", score=4.5)])
+
+    frame = pd.read_parquet(archive_dir / "leads").sort_values("id")
+    assert frame["id"].tolist() == ["1", "2"]
+    assert frame["email"].tolist()[1] == "a@b.com"
+    assert frame["score"].tolist()[1] == 4.5
+    # Generated columns are not archived
+    assert "search_text" not in frame.columns
+
+
+def test_reports_keep_json_and_unlisted_columns_as_text(archive_dir):
+    jobs.write_archive("reports", "b1", [{
+        "id": "r1", "business_id": "b1", "period": "weekly", "data": {"leads": 3}, "analysis": None,
+        "created_at": "2024-01-01T00:00:00+00:00", "extra": {"a": 1},
+    }])
+
+    frame = pd.read_parquet(archive_dir / "reports")
+    assert frame["data"].tolist() == ['{"leads":3}']
+    assert frame["extra"].tolist() == ['{"a":1}']
+
+
+def test_archive_bumps_the_etag_of_archived_reports(monkeypatch):
+    rows = [{"id": "r1", "business_id": "b1", "period": "weekly", "data": {}, "analysis": "", "created_at": "2020-01-01"}]
+    monkeypatch.setattr(jobs, "iter_business_ids", lambda business_id: ["b1"])
+    monkeypatch.setattr(jobs, "load_expired", lambda table, business_id, cutoff: rows)
+    monkeypatch.setattr(jobs, "delete_archived", lambda table, ids: None)
+    monkeypatch.setattr(shared_state, "is_shared", True)
+
+    before = asyncio.run(version_stamps.etag("b1", "reports"))
+    jobs.archive(Namespace(table="reports", business_id=None, dry_run=False))
+    assert asyncio.run(version_stamps.etag("b1", "reports")) != before
@@ -0,0 +1,126 @@
+import pytest
+
+from dedup import PHONE_BLOCK_MAX_SIZE, find_duplicate_groups, is_probable_duplicate, merge_group, name_overlap, normalize_email, normalize_phone
+
+
+@pytest.mark.parametrize("phone, expected", [
+    ("(11) 98765-4321", "+5511987654321"),
+    ("+55 11 98765-4321", "+5511987654321"),
+    ("011 98765-4321", "+5511987654321"),
+    # Long-distance carrier code (0 + 2 digits) before the DDD
+    ("0 21 11 98765-4321", "+5511987654321"),
+    ("0xx21 11 98765-4321", "+5511987654321"),
+    # DDD 55 (RS) must not be mistaken for the country code
+    ("(55) 99876-5432", "+5555998765432"),
+    ("+55 55 99876-5432", "+5555998765432"),
+    ("(55) 3222-1234", "+555532221234"),
+    ("0 15 55 99876-5432", "+5555998765432"),
+    # Mobiles saved before the 9th digit
+    ("(11) 8765-4321", "+5511987654321"),
+    ("+55 55 9876-5432", "+5555998765432"),
+    # Landlines keep 8 digits
+    ("(11) 3456-7890", "+551134567890"),
+])
+def test_normalize_phone(phone, expected):
+    assert normalize_phone(phone) == expected
+
+
+@pytest.mark.parametrize("phone", [None, "", "123", "(10) 98765-4321", "(11) 1234-5678", "1198765432100"])
+def test_normalize_phone_rejects_invalid(phone):
+    assert normalize_phone(phone) is None
+
+
+@pytest.mark.parametrize("email, expected", [
+    (" Ana.Silva+promo@Gmail.com ", "anasilva@gmail.com"),
+    ("ana.silva@googlemail.com", "anasilva@gmail.com"),
+    ("ana.silva+lp@empresa.com.br", "ana.silva@empresa.com.br"),
+    ("sem-arroba", None),
+    ("ana@localhost", None),
+    ("+tag@gmail.com", None),
+    (None, None),
+])
+def test_normalize_email(email, expected):
+    assert normalize_email(email) == expected
+
+
+def test_name_overlap():
+    assert name_overlap("Ana", "Ana Paula") == 1.0
+    assert name_overlap("JOÃO SILVA", "joao silva") == 1.0
+    assert name_overlap("Ana", "Bruno") < 0.6
+    # Missing names never block a phone match
+    assert name_overlap("", "Bruno") == 1.0
+
+
+def test_is_probable_duplicate():
+    lead = {"name": "Ana Silva", "email_normalized": "ana@x.com", "phone_normalized": "+5511987654321"}
+    assert is_probable_duplicate(lead, {"name": "Outra", "email_normalized": "ana@x.com"})
+    assert is_probable_duplicate(lead, {"name": "ana silva", "phone_normalized": "+5511987654321"})
+    # Same phone, different person (shared family or business line)
+    assert not is_probable_duplicate(lead, {"name": "Bruno", "phone_normalized": "+5511987654321"})
+    assert not is_probable_duplicate({"name": "A"}, {"name": "A"})
+
+
+def lead(id, name, created_at, email=None, phone=None, **extra):
+    return {"id": id, "name": name, "email": email, "phone": phone, "created_at": created_at, **extra}
+
+
+def test_find_duplicate_groups():
+    leads = [
+        lead("a", "Ana Silva", "2024-01-02", email="ana.silva@gmail.com"),
+        lead("b", "ANA", "2024-01-01", email="anasilva+lp@gmail.com"),
+        lead("c", "Bruno", "2024-01-03", phone="(11) 98765-4321"),
+        lead("d", "Bruno Souza", "2024-01-04", phone="+55 11 98765-4321"),
+        lead("e", "Carla", "2024-01-05", phone="11 98765-4321"),
+        lead("f", "Diego", "2024-01-06", email="diego@x.com"),
+    ]
+    groups = find_duplicate_groups(leads)
+    assert sorted([member["id"] for member in group] for group in groups) == [["b", "a"], ["c", "d"]]
+    # Members carry the normalized contacts, oldest first
+    email_group = next(group for group in groups if group[0]["id"] == "b")
+    assert email_group[0]["email_normalized"] == "anasilva@gmail.com"
+
+
+def test_find_duplicate_groups_is_transitive():
+    leads = [
+        lead("a", "Ana", "2024-01-01", email="ana@x.com"),
+        lead("b", "Ana", "2024-01-02", email="ana@x.com", phone="(11) 98765-4321"),
+        lead("c", "Ana Paula", "2024-01-03", phone="(11) 8765-4321"),
+    ]
+    assert [[member["id"] for member in group] for group in find_duplicate_groups(leads)] == [["a", "b", "c"]]
+
+
+def test_find_duplicate_groups_without_duplicates():
+    assert find_duplicate_groups([]) == []
+    assert find_duplicate_groups([lead("a", "Ana", "2024-01-01", email="ana@x.com")]) == []
+
+
+def test_oversized_blocks_stay_linear():
+    # A placeholder phone on thousands of forms: only identical names are duplicates
+    size = 100 * PHONE_BLOCK_MAX_SIZE
+    leads = [lead(str(i), f"Pessoa {i}", f"2024-01-01T00:00:{i:05d}", phone="(11) 99999-9999") for i in range(size)]
+    leads += [lead(f"ana{i}", "Ana Souza", f"2024-02-0{i + 1}", phone="(11) 99999-9999") for i in range(3)]
+    leads += [lead(f"x{i}", "", f"2024-03-0{i + 1}", phone="(11) 99999-9999") for i in range(2)]
+    # Every lead on one email is the same person, without pairing them all
+    leads += [lead(f"e{i}", f"Outro {i}", f"2024-04-01T00:00:{i:05d}", email="contato@x.com") for i in range(size)]
+
+    groups = find_duplicate_groups(leads)
+    assert sorted(len(group) for group in groups) == [3, size]
+    assert [member["id"] for member in min(groups, key=len)] == ["ana0", "ana1", "ana2"]
+
+
+def test_merge_group():
+    group = [
+        lead("a", "Ana", "2024-01-01", email="ana@x.com", status="new", interest=None),
+        lead("b", "Ana", "2024-01-02", phone="(11) 98765-4321", status="qualified", interest="Corte",
+             phone_normalized="+5511987654321"),
+        lead("c", "Ana", "2024-01-03", status="lost", interest="Barba"),
+    ]
+    survivor, duplicate_ids = merge_group(group)
+    assert survivor["id"] == "a"
+    assert survivor["email"] == "ana@x.com"
+    assert survivor["phone"] == "(11) 98765-4321"
+    assert survivor["phone_normalized"] == "+5511987654321"
+    # First non-empty value wins, the most advanced status wins
+    assert survivor["interest"] == "Corte"
+    assert survivor["status"] == "qualified"
+    assert duplicate_ids == ["b", "c"]
@@ -0,0 +1,68 @@
+import asyncio
+from argparse import Namespace
+
+import pandas as pd
+import pytest
+
+import jobs
+from scoring import score_frame
+from server import shared_state, version_stamps
+
+
+class FakeSupabase:
+    """Accepts any query chain; every execute() returns no rows"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append(name)
+            return self
+        return call
+
+    def execute(self):
+        return type("Result", (), {"data": []})()
+
+
+def leads_etag():
+    return asyncio.run(version_stamps.etag("b1", "leads"))
+
+
+@pytest.fixture
+def business(monkeypatch):
+    monkeypatch.setattr(jobs, "supabase", FakeSupabase())
+    monkeypatch.setattr(jobs, "iter_business_ids", lambda business_id: ["b1"])
+    monkeypatch.setattr(shared_state, "is_shared", True)
+
+
+def lead(lead_id, name, created_at, **fields):
+    base = {"id": lead_id, "name": name, "email": None, "phone": None, "interest": None, "source": "manual",
+            "status": "new", "score": None, "created_at": created_at}
+    return {**base, **fields}
+
+
+def test_dedup_apply_invalidates_the_leads_etag(business, monkeypatch):
+    leads = [lead("a", "Ana", "2024-01-01", email="ana@x.com"), lead("b", "Ana", "2024-01-02", email="ana@x.com")]
+    monkeypatch.setattr(jobs, "load_leads", lambda business_id: leads)
+
+    before = leads_etag()
+    jobs.dedup_leads(Namespace(business_id=None, apply=False))
+    assert leads_etag() == before
+    jobs.dedup_leads(Namespace(business_id=None, apply=True))
+    assert leads_etag() != before
+
+
+def test_score_leads_invalidates_the_leads_etag_when_scores_move(business, monkeypatch):
+    leads = [lead("a", "Ana", "2024-01-01T00:00:00+00:00", phone="(11) 98765-4321")]
+    monkeypatch.setattr(jobs, "load_leads", lambda business_id: leads)
+
+    before = leads_etag()
+    jobs.score_leads(Namespace(business_id=None))
+    after = leads_etag()
+    assert after != before
+
+    # Unchanged scores write nothing and keep the ETag
+    leads[0]["score"] = score_frame(pd.DataFrame(leads), {})["score"][0]
+    jobs.score_leads(Namespace(business_id=None))
+    assert leads_etag() == after
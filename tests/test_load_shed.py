@@ -0,0 +1,13 @@
+from fastapi.testclient import TestClient
+
+import server
+
+
+def test_shed_response_carries_cors_headers(monkeypatch):
+    monkeypatch.setattr(server.load_monitor, "overloaded", lambda: True)
+    response = TestClient(server.app).get("/api/p/promo", headers={"Origin": "https://cliente.example"})
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert response.headers["access-control-allow-origin"] == "*"
+    assert "Retry-After" in response.headers["access-control-expose-headers"]
@@ -0,0 +1,54 @@
+import pytest
+
+from niches import canonical_niche, resolve_city, resolve_niche
+
+
+@pytest.mark.parametrize("niche, expected", [
+    ("Barbearia", "barbearia"),
+    ("barbearia masculina premium", "barbearia"),
+    ("Barbearia do João", "barbearia"),
+    ("barbeara", "barbearia"),
+    ("Salão", "salao_beleza"),
+    ("Salão de Beleza", "salao_beleza"),
+    ("manicure e pedicure", "salao_beleza"),
+    ("spa", "clinica_estetica"),
+    ("limpeza de pele", "clinica_estetica"),
+    ("hamburgueria artesanal", "restaurante"),
+    ("pet shop banho e tosa", "loja_geral"),
+    ("limpeza residencial", "servicos_gerais"),
+    ("", "outro"),
+])
+def test_canonical_niche(niche, expected):
+    assert canonical_niche(niche) == expected
+
+
+@pytest.mark.parametrize("niche, expected", [
+    # Generic words only match on their own
+    ("salão de festas", "salao_festas"),
+    ("mercado imobiliário", "mercado_imobiliario"),
+    # A qualifier blocks both containment and fuzzy matching
+    ("estética automotiva", "estetica_automotiva"),
+    ("spa automotivo", "spa_automotivo"),
+    ("spa pet", "spa_pet"),
+    ("salão de beleza para festas", "salao_beleza_festas"),
+])
+def test_canonical_niche_keeps_other_niches_apart(niche, expected):
+    assert canonical_niche(niche) == expected
+
+
+def test_resolve_niche_keeps_unknown_wording():
+    assert resolve_niche("Estética automotiva") == ("estetica_automotiva", "Estética automotiva")
+    assert resolve_niche("barber shop") == ("barbearia", "Barbearia")
+
+
+@pytest.mark.parametrize("city, expected", [
+    ("sampa", ("sao_paulo", "São Paulo")),
+    ("São Paulo - SP", ("sao_paulo", "São Paulo")),
+    ("bh", ("belo_horizonte", "Belo Horizonte")),
+    ("maringá - pr", ("maringa", "Maringá")),
+    ("SÃO JOSÉ DOS CAMPOS/SP", ("sao_jose_dos_campos", "São José dos Campos")),
+    ("Embu-Guaçu", ("embu_guacu", "Embu-Guaçu")),
+    (None, ("", "")),
+])
+def test_resolve_city(city, expected):
+    assert resolve_city(city) == expected
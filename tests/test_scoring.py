@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+
+from scoring import (
+    COMPLETENESS_WEIGHT, INTENT_WEIGHT, PAGE_RATE_PRIOR, RECENCY_WEIGHT, SOURCE_WEIGHT,
+    page_conversion_rates, score_frame, score_lead, source_slug,
+)
+
+NOW = datetime(2024, 6, 1, 12, 0, tzinfo=timezone.utc)
+PAGE_RATES = {"promo": 0.3, "fria": 0.01}
+
+
+def lead(**fields):
+    base = {"source": "manual", "created_at": None, "interest": None, "phone": None, "email": None}
+    return {**base, **fields}
+
+
+EDGE_LEADS = [
+    lead(),
+    lead(source=None, created_at=NOW.isoformat()),
+    lead(source="landing_page:promo", created_at=(NOW - timedelta(days=7)).isoformat(),
+         phone="(11) 98765-4321", email="a@b.com", interest="Orçamento urgente para hoje"),
+    lead(source="landing_page:fria", created_at="2024-05-01T08:00:00Z", interest="   "),
+    lead(source="landing_page:apagada", created_at="2024-05-31T12:00:00", phone="123", email="sem-arroba"),
+    lead(source="landing_page", created_at=(NOW + timedelta(hours=3)).isoformat(), interest="preço? valor? PROMOÇÃO!"),
+    lead(source="importado", created_at="2023-01-01T00:00:00+00:00", email="ana@gmail.com", interest="Só olhando"),
+    lead(source="manual", created_at="2024-05-30T10:00:00.123456+00:00", phone="+55 55 9876-5432", interest="agendamento"),
+]
+
+
+def test_score_frame_matches_score_lead():
+    expected = [score_lead(row, PAGE_RATES, NOW) for row in EDGE_LEADS]
+    frame = score_frame(pd.DataFrame(EDGE_LEADS), PAGE_RATES, NOW)
+    assert frame["score"].tolist() == pytest.approx(expected, abs=0.05)
+
+
+def test_score_bounds():
+    best = lead(source="landing_page:promo", created_at=NOW.isoformat(), phone="(11) 98765-4321",
+                email="a@b.com", interest="orçamento urgente")
+    assert score_lead(best, PAGE_RATES, NOW) == SOURCE_WEIGHT + 20 + RECENCY_WEIGHT + INTENT_WEIGHT + COMPLETENESS_WEIGHT
+    assert score_lead(lead(source=None), {}, NOW) == 0
+
+
+def test_recency_halves_every_week():
+    fresh = score_lead(lead(source=None, created_at=NOW.isoformat()), {}, NOW)
+    week_old = score_lead(lead(source=None, created_at=(NOW - timedelta(days=7)).isoformat()), {}, NOW)
+    assert fresh == RECENCY_WEIGHT
+    assert week_old == pytest.approx(RECENCY_WEIGHT / 2, abs=0.05)
+
+
+def test_intent_keywords_ignore_accents_and_case():
+    assert score_lead(lead(source=None, interest="ORÇAMENTO"), {}, NOW) == pytest.approx(INTENT_WEIGHT / 2 + COMPLETENESS_WEIGHT * 0.2)
+    assert score_lead(lead(source=None, interest="preciso de orçamento urgente"), {}, NOW) == pytest.approx(INTENT_WEIGHT + COMPLETENESS_WEIGHT * 0.2)
+
+
+def test_page_conversion_rates_are_smoothed():
+    rates = page_conversion_rates([
+        {"slug": "nova", "visits": 0, "conversions": 0},
+        {"slug": "sorte", "visits": 1, "conversions": 1},
+        {"slug": "madura", "visits": 10000, "conversions": 1000},
+    ])
+    assert rates["nova"] == PAGE_RATE_PRIOR
+    assert rates["sorte"] < 0.1
+    assert rates["madura"] == pytest.approx(0.1, abs=0.001)
+
+
+@pytest.mark.parametrize("source, slug", [
+    ("landing_page:promo", "promo"),
+    ("landing_page:", ""),
+    ("landing_page", None),
+    ("manual", None),
+    (None, None),
+])
+def test_source_slug(source, slug):
+    assert source_slug(source) == slug
@@ -0,0 +1,166 @@
+import asyncio
+import time
+
+import pytest
+
+import server
+from server import LocalStateBackend, PageCounters, SharedCache, SharedStateUnavailable, VersionStamps, handle_coordination_message
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class UnreachableBackend(LocalStateBackend):
+    """Shared state whose every command fails, as RedisStateBackend does while Redis is down"""
+
+    is_shared = True
+
+    async def fail(self, *args, **kwargs):
+        raise SharedStateUnavailable("Redis indisponível")
+
+    get = set = delete = hsetnx = hincrby = hmget = drain_hash = publish = fail
+
+
+@pytest.fixture
+def state(monkeypatch):
+    backend = LocalStateBackend()
+    backend.is_shared = True
+    backend.subscribe(handle_coordination_message)
+    monkeypatch.setattr(server, "shared_state", backend)
+    return backend
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(SharedCache, "registry", {})
+    return SharedCache("test", ttl=60, max_entries=10)
+
+
+def test_lease_is_renewed_by_its_owner_and_taken_once_expired(state):
+    assert run(state.acquire_lease("leader", "a", 0.05))
+    assert not run(state.acquire_lease("leader", "b", 0.05))
+    assert run(state.acquire_lease("leader", "a", 0.05))
+
+    time.sleep(0.06)
+    assert run(state.acquire_lease("leader", "b", 0.05))
+    assert not run(state.acquire_lease("leader", "a", 0.05))
+
+
+def test_lease_release_only_by_its_owner(state):
+    run(state.acquire_lease("leader", "a", 60))
+    run(state.release_lease("leader", "b"))
+    assert not run(state.acquire_lease("leader", "b", 60))
+
+    run(state.release_lease("leader", "a"))
+    assert run(state.acquire_lease("leader", "b", 60))
+
+
+class FakeRpc:
+    def __init__(self, fail):
+        self.fail = fail
+        self.calls = []
+
+    def rpc(self, name, params):
+        self.calls.append((name, params))
+        return self
+
+    def execute(self):
+        if self.fail:
+            raise ConnectionError("banco indisponível")
+        return type("Result", (), {"data": [{"page_id": "p1", "business_id": "b1"}]})()
+
+
+def test_failed_flush_puts_the_counts_back(state, monkeypatch):
+    counters = PageCounters()
+    run(counters.add("p1", visits=3, conversions=1))
+
+    monkeypatch.setattr(server, "supabase", FakeRpc(fail=True))
+    assert run(counters.flush()) == 0
+    assert state._hashes[PageCounters.KEY] == {"p1:visits": 3, "p1:conversions": 1}
+
+    run(counters.add("p1", visits=2))
+    database = FakeRpc(fail=False)
+    monkeypatch.setattr(server, "supabase", database)
+    assert run(counters.flush()) == 1
+    assert database.calls == [("increment_page_counters", {"p_counters": [{"id": "p1", "visits": 5, "conversions": 1}]})]
+    assert PageCounters.KEY not in state._hashes
+
+
+def test_invalidate_reaches_the_other_workers(state, cache):
+    messages = []
+    state.subscribe(messages.append)
+    run(cache.set("k", {"v": 1}))
+    run(cache.invalidate("k"))
+
+    assert messages == [{"type": "invalidate", "cache": "test", "key": "k"}]
+    assert run(state.get(cache.shared_key("k"))) is None
+    # Another worker still holding its local copy drops it when the message arrives
+    cache.local.set("k", {"v": 1})
+    handle_coordination_message(messages[0])
+    assert cache.local.get("k") is None
+
+
+def test_resync_clears_local_copies(state, cache):
+    cache.local.set("k", 1)
+    handle_coordination_message({"type": "resync"})
+    assert cache.local.get("k") is None
+
+
+def test_etag_changes_when_the_hash_starts_over(state):
+    stamps = VersionStamps()
+    before = run(stamps.etag("b1", "leads"))
+    assert run(stamps.etag("b1", "leads")) == before
+
+    # Redis restart or eviction: the counters and the epoch go together
+    state._hashes.clear()
+    assert run(stamps.etag("b1", "leads")) != before
+
+
+def test_unreachable_shared_state_degrades_to_local(monkeypatch, cache):
+    monkeypatch.setattr(server, "shared_state", UnreachableBackend())
+    stamps = VersionStamps()
+
+    run(cache.set("k", 1))
+    assert run(cache.get("k")) == 1
+    run(cache.invalidate("k"))
+    assert run(cache.get("k")) is None
+
+    run(stamps.bump("b1", "leads"))
+    assert stamps.pending == {"b1": {"leads"}}
+    assert run(stamps.etag("b1", "leads")) is None
+
+    counters = PageCounters()
+    run(counters.add("p1", visits=2))
+    assert counters.unsent == {"p1:visits": 2}
+    assert run(counters.flush()) == 0
+
+
+def test_missed_bumps_are_replayed(state):
+    stamps = VersionStamps()
+    stamps.pending = {"b1": {"leads"}}
+    etag = run(stamps.etag("b1", "leads"))
+    assert stamps.pending == {}
+    assert etag.endswith('-1"')
+
+
+def test_redis_clients_start_and_fall_back_while_redis_is_down():
+    async def scenario():
+        broker = server.RedisBroker("redis://127.0.0.1:1")
+        await broker.start()
+        queue = broker.subscribe("b1")
+        await broker.publish("b1", {"type": "lead.created"})
+        await broker.publish("b1", {"type": "lead.updated"})
+        assert not broker.gate.is_open
+        events = [queue.get_nowait(), queue.get_nowait()]
+        await broker.stop()
+
+        limiter = server.RedisRateLimiter("redis://127.0.0.1:1", window=60)
+        allowed = [await limiter.hit("ip", 2) for _ in range(3)]
+        assert not limiter.gate.is_open
+        await limiter.close()
+        return events, allowed
+
+    events, allowed = run(scenario())
+    assert [event["type"] for event in events] == ["lead.created", "lead.updated"]
+    assert allowed == [True, True, False]